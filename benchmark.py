@@ -0,0 +1,430 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+
+try:
+    import resource
+except ImportError:  # на Windows модуля resource нет — пиковую память не замеряем
+    resource = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+INTERFACE_MODULES = ('inquirer', 'prompt_toolkit', 'rich')
+
+
+class Startup:
+    """Класс, замеряющий время импорта PDFer как библиотеки"""
+
+    @staticmethod
+    def measure() -> tuple[int, list[str]]:
+        """Импортирует `pdfer` в отдельном процессе с `python -X importtime` и возвращает
+        суммарное время импорта в микросекундах и список загруженных модулей интерфейса"""
+        code = (
+            f'import sys; sys.path.insert(0, {ROOT!r}); import pdfer; '
+            f'print(",".join(m for m in sys.modules if m.split(".")[0] in {INTERFACE_MODULES!r}))'
+        )
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, check=True
+        )
+        cumulative = 0
+        for line in result.stderr.splitlines():
+            match = re.match(r'^import time:\s+\d+\s+\|\s+(\d+)\s+\|\s?(\S+)$', line)
+            if match and match.group(2) == 'pdfer':
+                cumulative = int(match.group(1))
+        return cumulative, [module for module in result.stdout.strip().split(',') if module]
+
+    @staticmethod
+    def check(limit_ms: float, runs: int = 5) -> bool:
+        """Проверяет, что импорт `pdfer` не загружает модули интерфейса и укладывается в `limit_ms` миллисекунд
+        (берётся лучшее время из `runs` запусков)"""
+        best, loaded = min(Startup.measure() for _ in range(runs))
+        print(f'import pdfer: {best / 1000:.1f} мс (лимит {limit_ms:.0f} мс)')
+        if loaded:
+            print(f'При импорте загружены модули интерфейса: {", ".join(sorted(loaded))}')
+        return not loaded and best / 1000 <= limit_ms
+
+
+class Synthetic:
+    """Класс, генерирующий синтетические PDF-файлы для бенчмарков"""
+
+    @staticmethod
+    def make_pdf(path: str, pages: int, image_kb: int = 0, shared: bool = True, seed: int = 0):
+        """Создаёт PDF-файл `path` из `pages` страниц с текстом и, если `image_kb > 0`, картинкой такого размера\n
+        При `shared = True` шрифт и картинка — общие объекты для всех страниц, иначе у каждой страницы
+        свои побайтово одинаковые копии (как в документах, собранных из одного шаблона)"""
+        import PyPDF2
+        from PyPDF2.generic import ArrayObject, DecodedStreamObject, DictionaryObject, NameObject, NumberObject
+
+        writer = PyPDF2.PdfWriter()
+        image_data = random.Random(seed).randbytes(image_kb * 1024)
+
+        def resources() -> DictionaryObject:
+            font = DictionaryObject(
+                {
+                    NameObject('/Type'): NameObject('/Font'),
+                    NameObject('/Subtype'): NameObject('/Type1'),
+                    NameObject('/BaseFont'): NameObject('/Helvetica'),
+                }
+            )
+            result = DictionaryObject({NameObject('/Font'): DictionaryObject({NameObject('/F1'): font})})
+            if image_kb:
+                image = DecodedStreamObject()
+                image.set_data(image_data)
+                image.update(
+                    {
+                        NameObject('/Type'): NameObject('/XObject'),
+                        NameObject('/Subtype'): NameObject('/Image'),
+                        NameObject('/Width'): NumberObject(1024),
+                        NameObject('/Height'): NumberObject(image_kb),
+                        NameObject('/ColorSpace'): NameObject('/DeviceGray'),
+                        NameObject('/BitsPerComponent'): NumberObject(8),
+                    }
+                )
+                result[NameObject('/XObject')] = DictionaryObject({NameObject('/Im1'): writer._add_object(image)})
+            return result
+
+        common = writer._add_object(resources()) if shared else None
+        for page_num in range(pages):
+            page = writer.add_page(PyPDF2.PageObject.create_blank_page(None, 595, 842))
+            content = DecodedStreamObject()
+            text = f'BT /F1 24 Tf 72 760 Td (Page {page_num + 1}) Tj ET\n'
+            text += ''.join(f'BT /F1 10 Tf 72 {740 - 12 * i} Td (Line {i}) Tj ET\n' for i in range(50))
+            if image_kb:
+                text += 'q 451 0 0 200 72 72 cm /Im1 Do Q\n'
+            content.set_data(text.encode())
+            page[NameObject('/Contents')] = writer._add_object(content)
+            page[NameObject('/Resources')] = common or writer._add_object(resources())
+            page[NameObject('/MediaBox')] = ArrayObject(map(NumberObject, (0, 0, 595, 842)))
+        with open(path, 'wb') as file:
+            writer.write(file)
+
+    @staticmethod
+    def make_fixtures(workdir: str, scale: float = 1.0):
+        """Создаёт в папке `workdir` набор входных файлов для всех сценариев; `scale` масштабирует их размеры"""
+        big = max(10, int(1000 * scale))
+        Synthetic.make_pdf(os.path.join(workdir, 'big.pdf'), big)
+        Synthetic.make_pdf(os.path.join(workdir, 'images.pdf'), max(10, int(200 * scale)), image_kb=64)
+        for i in range(max(2, int(50 * scale))):
+            Synthetic.make_pdf(os.path.join(workdir, f'invoice_{i:03d}.pdf'), 3, image_kb=32, shared=False, seed=1)
+
+
+class Scenarios:
+    """Класс, описывающий сценарии бенчмарков\n
+    Каждый сценарий получает папку с входными файлами и возвращает список созданных файлов"""
+
+    page_counts: dict[str, int] = {}  # число страниц входных файлов, считается до начала замера
+
+    @staticmethod
+    def inputs(workdir: str, prefix: str) -> list[str]:
+        return sorted(os.path.join(workdir, name) for name in os.listdir(workdir) if name.startswith(prefix))
+
+    @staticmethod
+    def extract_single(workdir: str, pdfer) -> list[str]:
+        return [pdfer.PDFer.extract_page_range(os.path.join(workdir, 'big.pdf'), 7, output_pdf=f'{workdir}/out')]
+
+    @staticmethod
+    def extract_many(workdir: str, pdfer) -> list[str]:
+        input_pdf = os.path.join(workdir, 'big.pdf')
+        page_count = Scenarios.page_counts['big.pdf']
+        ranges = ', '.join(f'{i}-{min(i + 4, page_count)}' for i in range(1, page_count + 1, 10))
+        return [pdfer.PDFer.extract_pages(input_pdf, pdfer.PagePlan.compile(ranges), f'{workdir}/out.pdf')]
+
+    @staticmethod
+    def extract_reversed_duplicates(workdir: str, pdfer) -> list[str]:
+        input_pdf = os.path.join(workdir, 'images.pdf')
+        page_count = Scenarios.page_counts['images.pdf']
+        ranges = f'{page_count}-1, ' + ', '.join(['1, 1, 3-5, 4, 1'] * 20)
+        return [pdfer.PDFer.extract_pages(input_pdf, pdfer.PagePlan.compile(ranges), f'{workdir}/out.pdf')]
+
+    @staticmethod
+    def merge_many(workdir: str, pdfer) -> list[str]:
+        pdfer.PDFer.merge_pdfs(Scenarios.inputs(workdir, 'invoice_'), f'{workdir}/out.pdf')
+        return [f'{workdir}/out.pdf']
+
+    @staticmethod
+    def merge_streaming(workdir: str, pdfer) -> list[str]:
+        pdfer.PDFer.merge_pdfs(Scenarios.inputs(workdir, 'invoice_'), f'{workdir}/out.pdf', streaming=True)
+        return [f'{workdir}/out.pdf']
+
+    @staticmethod
+    def split_chunks(workdir: str, pdfer) -> list[str]:
+        return pdfer.PDFer.split(os.path.join(workdir, 'big.pdf'), 10, output_pdf=f'{workdir}/out')
+
+    @staticmethod
+    def names() -> list[str]:
+        service = ('inputs', 'names', 'run')
+        scenarios = [name for name, value in vars(Scenarios).items() if isinstance(value, staticmethod)]
+        return [name for name in scenarios if name not in service]
+
+    @staticmethod
+    def run(name: str, workdir: str, backend: str = 'auto') -> dict:
+        """Выполняет сценарий `name` в текущем процессе через бэкенд `backend`
+        и возвращает время, пиковую память и размер результата"""
+        sys.path.insert(0, ROOT)
+        import pdfer
+
+        pdfer.Backend.choice = backend
+        scratch = tempfile.mkdtemp(dir=workdir)
+        for file_name in os.listdir(workdir):
+            if file_name.endswith('.pdf'):
+                os.link(os.path.join(workdir, file_name), os.path.join(scratch, file_name))
+                Scenarios.page_counts[file_name] = pdfer.DirectoryIndex.peek(os.path.join(workdir, file_name))['pages']
+        started = time.perf_counter()
+        outputs = getattr(Scenarios, name)(scratch, pdfer)
+        seconds = time.perf_counter() - started
+        output_bytes = sum(os.path.getsize(output) for output in outputs)
+        shutil.rmtree(scratch)
+
+        peak_rss = None
+        if resource is not None:
+            peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            peak_rss = peak_rss * 1024 if sys.platform != 'darwin' else peak_rss  # на Linux — в КБ, на macOS — в байтах
+        return {'seconds': seconds, 'peak_rss': peak_rss, 'output_bytes': output_bytes}
+
+
+class Suite:
+    """Класс, запускающий сценарии и сравнивающий результаты с сохранённым базовым уровнем"""
+
+    @staticmethod
+    def measure(name: str, workdir: str, repeat: int, backend: str = 'auto') -> dict:
+        """Запускает сценарий `name` `repeat` раз, каждый раз в отдельном процессе, чтобы пиковая память
+        не смешивалась между сценариями, и возвращает лучшее время и максимальную память"""
+        runs = []
+        for _ in range(repeat):
+            result = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), 'scenario', name, workdir, '--backend', backend],
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+        return {
+            'seconds': min(run['seconds'] for run in runs),
+            'peak_rss': max((run['peak_rss'] for run in runs if run['peak_rss'] is not None), default=None),
+            'output_bytes': runs[-1]['output_bytes'],
+        }
+
+    @staticmethod
+    def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+        """Сравнивает результаты `results` с базовым уровнем `baseline` и возвращает список регрессий"""
+        regressions = []
+        for name, result in results.items():
+            for metric in ('seconds', 'peak_rss', 'output_bytes'):
+                old, new = baseline.get(name, {}).get(metric), result[metric]
+                if old and new is not None and new > old * (1 + tolerance):
+                    regressions.append(f'{name}: {metric} {old:.4g} → {new:.4g} (+{(new / old - 1) * 100:.0f}%)')
+        return regressions
+
+    @staticmethod
+    def run(
+        scenarios: list[str],
+        scale: float,
+        repeat: int,
+        baseline: str,
+        save: str,
+        tolerance: float,
+        backend: str = 'auto',
+    ) -> bool:
+        """Генерирует входные файлы, прогоняет сценарии `scenarios` через бэкенд `backend`, печатает таблицу
+        результатов и, если указан `baseline`, проверяет их на регрессии. Возвращает `True`, если регрессий нет"""
+        workdir = tempfile.mkdtemp(prefix='pdfer-bench-')
+        try:
+            Synthetic.make_fixtures(workdir, scale)
+            results = {}
+            print(f'{"сценарий":<30}{"время, с":>12}{"память, МБ":>14}{"результат, КБ":>16}')
+            for name in scenarios:
+                results[name] = result = Suite.measure(name, workdir, repeat, backend)
+                rss = f'{result["peak_rss"] / 2**20:.1f}' if result['peak_rss'] is not None else '—'
+                print(f'{name:<30}{result["seconds"]:>12.4f}{rss:>14}{result["output_bytes"] / 1024:>16.1f}')
+        finally:
+            shutil.rmtree(workdir)
+
+        if save:
+            with open(save, 'w', encoding='utf-8') as file:
+                json.dump(results, file, indent=2)
+        if not baseline:
+            return True
+        with open(baseline, encoding='utf-8') as file:
+            regressions = Suite.compare(results, json.load(file), tolerance)
+        for regression in regressions:
+            print(f'Регрессия: {regression}')
+        return not regressions
+
+
+class Parity:
+    """Класс, проверяющий, что все установленные бэкенды PDFer записывают одинаковые страницы
+
+    Страницы выходных файлов сравниваются со страницами входных по отпечаткам: размерам, повороту,
+    распакованному содержимому и ресурсам. Сжатие и номера объектов у бэкендов разные, поэтому в отпечаток
+    не входят фильтры потоков, длины и ссылки — только то, что влияет на отрисовку страницы"""
+
+    @staticmethod
+    def normalize(obj, stack: tuple = ()):
+        """Переводит объект PyPDF2 `obj` со всеми вложенными объектами в сравнимую структуру из кортежей"""
+        from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+
+        if isinstance(obj, IndirectObject):
+            if (obj.idnum, obj.generation) in stack:  # обратная ссылка, например /P у аннотации
+                return ('cycle',)
+            return Parity.normalize(obj.get_object(), stack + ((obj.idnum, obj.generation),))
+        if isinstance(obj, DictionaryObject):
+            skip = {'/Parent', '/Length', '/Filter', '/DecodeParms'} if isinstance(obj, StreamObject) else {'/Parent'}
+            items = tuple(sorted((key, Parity.normalize(obj[key], stack)) for key in obj if key not in skip))
+            if isinstance(obj, StreamObject):
+                return ('stream', hashlib.sha256(obj.get_data()).hexdigest(), items)
+            return ('dict', items)
+        if isinstance(obj, ArrayObject):
+            return ('array', tuple(Parity.normalize(value, stack) for value in obj))
+        return (type(obj).__name__, str(obj))
+
+    @staticmethod
+    def fingerprints(path: str) -> list[str]:
+        """Возвращает отпечатки всех страниц PDF-файла `path`"""
+        import PyPDF2
+
+        result = []
+        for page in PyPDF2.PdfReader(path).pages:
+            contents = page.get('/Contents')
+            contents = contents.get_object() if contents is not None else []
+            streams = contents if isinstance(contents, list) else [contents]  # массив потоков склеивается
+            fingerprint = (
+                tuple(map(float, page.mediabox)),
+                tuple(map(float, page.cropbox)),
+                int(page.get('/Rotate', 0)),
+                hashlib.sha256(b'\n'.join(stream.get_object().get_data() for stream in streams)).hexdigest(),
+                Parity.normalize(page.get('/Resources')),
+                Parity.normalize(page.get('/Annots')),
+            )
+            result.append(hashlib.sha256(repr(fingerprint).encode()).hexdigest())
+        return result
+
+    @staticmethod
+    def merge(inputs: list[str], output: str, pdfer) -> list[str]:
+        pdfer.PDFer.merge_pdfs(inputs, f'{output}.pdf')
+        return [f'{output}.pdf']
+
+    @staticmethod
+    def checks(inputs: list[str], pdfer) -> list[tuple[str, Callable[[str], list[str]], list[str]]]:
+        """Возвращает проверки для входных файлов `inputs`: название, функцию, записывающую выходные файлы,
+        и ожидаемые отпечатки страниц всех выходных файлов подряд"""
+        checks = []
+        for input_pdf in inputs:
+            pages = Parity.fingerprints(input_pdf)
+            count = len(pages)
+            name = os.path.basename(input_pdf)
+            # в обратном порядке и с повторами: повторы бэкенды копируют неглубоко
+            ranges = f'{count}-1, 1, 1, {min(3, count)}'
+            order = list(range(count - 1, -1, -1)) + [0, 0, min(3, count) - 1]
+            checks.append(
+                (
+                    f'extract {name}',
+                    lambda output, input_pdf=input_pdf, ranges=ranges: [
+                        pdfer.PDFer.extract_pages(input_pdf, pdfer.PagePlan.compile(ranges), f'{output}.pdf')
+                    ],
+                    [pages[i] for i in order],
+                )
+            )
+            checks.append(
+                (
+                    f'split {name}',
+                    lambda output, input_pdf=input_pdf: pdfer.PDFer.split(input_pdf, 3, output_pdf=output),
+                    pages,
+                )
+            )
+        merged = inputs + inputs[:1]
+        checks.append(
+            (
+                'merge',
+                lambda output: Parity.merge(merged, output, pdfer),
+                [fingerprint for input_pdf in merged for fingerprint in Parity.fingerprints(input_pdf)],
+            )
+        )
+        return checks
+
+    @staticmethod
+    def run(inputs: list[str], backends: list[str]) -> bool:
+        """Прогоняет извлечение, разбиение и склеивание синтетических файлов и файлов `inputs` через каждый
+        из бэкендов `backends` (по умолчанию — все установленные) и печатает результаты сравнения страниц.
+        Возвращает `True`, если все бэкенды записали ожидаемые страницы"""
+        sys.path.insert(0, ROOT)
+        import pdfer
+
+        workdir = tempfile.mkdtemp(prefix='pdfer-parity-')
+        ok = True
+        try:
+            Synthetic.make_fixtures(workdir, 0.01)
+            fixtures = Scenarios.inputs(workdir, '')
+            checks = Parity.checks(fixtures + [os.path.abspath(path) for path in inputs], pdfer)
+            for backend in backends or pdfer.Backend.available():
+                pdfer.Backend.choice = backend
+                for number, (name, check, expected) in enumerate(checks):
+                    output = os.path.join(workdir, f'out_{backend}_{number}')
+                    try:
+                        actual = [fingerprint for path in check(output) for fingerprint in Parity.fingerprints(path)]
+                    except Exception as e:
+                        print(f'{backend:<10}{name:<40}ошибка: {e}')
+                        ok = False
+                        continue
+                    if actual == expected:
+                        print(f'{backend:<10}{name:<40}ok')
+                        continue
+                    ok = False
+                    differs = [i + 1 for i, (a, b) in enumerate(zip(actual, expected)) if a != b]
+                    if len(actual) != len(expected):
+                        print(f'{backend:<10}{name:<40}страниц {len(actual)} вместо {len(expected)}')
+                    else:
+                        print(f'{backend:<10}{name:<40}отличаются страницы {", ".join(map(str, differs))}')
+        finally:
+            shutil.rmtree(workdir)
+        return ok
+
+
+def main():
+    """Точка входа в бенчмарки"""
+    parser = argparse.ArgumentParser(prog='benchmark', description='Бенчмарки PDFer')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    startup = commands.add_parser('startup', help='время импорта pdfer как библиотеки')
+    startup.add_argument('--limit-ms', type=float, default=300, help='допустимое время импорта в миллисекундах')
+    startup.add_argument('--runs', type=int, default=5, help='количество запусков')
+
+    run = commands.add_parser('run', help='прогнать сценарии на синтетических PDF-файлах')
+    run.add_argument('--scenario', nargs='+', choices=Scenarios.names(), default=Scenarios.names(), help='сценарии')
+    run.add_argument('--scale', type=float, default=1.0, help='множитель размеров входных файлов')
+    run.add_argument('--repeat', type=int, default=3, help='количество запусков каждого сценария')
+    run.add_argument('--baseline', default='', help='JSON-файл с базовым уровнем для сравнения')
+    run.add_argument('--save', default='', help='сохранить результаты в JSON-файл как новый базовый уровень')
+    run.add_argument('--tolerance', type=float, default=0.2, help='допустимое ухудшение, 0.2 — на 20%%')
+
+    run.add_argument('--backend', default='auto', help='бэкенд PDFer: auto, pikepdf, pypdf или PyPDF2')
+
+    scenario = commands.add_parser('scenario', help='выполнить один сценарий в текущем процессе (служебная)')
+    scenario.add_argument('name', choices=Scenarios.names())
+    scenario.add_argument('workdir')
+    scenario.add_argument('--backend', default='auto')
+
+    parity = commands.add_parser('parity', help='проверить, что все бэкенды записывают одинаковые страницы')
+    parity.add_argument('--input', nargs='*', default=[], help='дополнительные входные PDF-файлы')
+    parity.add_argument('--backend', nargs='*', default=[], help='проверяемые бэкенды (по умолчанию все установленные)')
+
+    args = parser.parse_args()
+    if args.command == 'startup':
+        sys.exit(0 if Startup.check(args.limit_ms, args.runs) else 1)
+    if args.command == 'run':
+        ok = Suite.run(args.scenario, args.scale, args.repeat, args.baseline, args.save, args.tolerance, args.backend)
+        sys.exit(0 if ok else 1)
+    if args.command == 'parity':
+        sys.exit(0 if Parity.run(args.input, args.backend) else 1)
+    print(json.dumps(Scenarios.run(args.name, args.workdir, args.backend)))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,45 @@
-import importlib
+import abc
+import argparse
+import array
+import atexit
+import collections
+import concurrent.futures
+import fnmatch
+import hashlib
+import io
+import importlib.util
+import itertools
+import json
+import mmap
 import os
 import re
+import select
 import shutil
+import struct
 import sys
 import textwrap
+import threading
+import time
+import zlib
+from collections.abc import Callable, Sequence
 from datetime import datetime
 from typing import TYPE_CHECKING
 
+try:
+    import resource
+except ImportError:  # на Windows модуля resource нет — пиковую память не замеряем
+    resource = None
+
 if TYPE_CHECKING:
+    import asyncio
+
     import inquirer
     import PyPDF2
+    from inquirer.errors import ValidationError
+    from prompt_toolkit import PromptSession
+    from prompt_toolkit.completion import WordCompleter
+    from prompt_toolkit.validation import Validator
+    from rich.console import Console
 
 
 def is_int(s: str) -> bool:
@@ -35,52 +65,737 @@ def import_or_install_module(module_name: str):
         globals()[module_name.replace('-', '_')] = importlib.import_module(module_name.replace('-', '_'))
 
 
-clear()
-import_or_install_module('inquirer')
-from inquirer.errors import ValidationError  # noqa: E402
+try:
+    import PyPDF2
+except ModuleNotFoundError:  # операции работают и через pypdf или pikepdf, а для меню PyPDF2 доустанавливается
+    PyPDF2 = None
+
+console: 'Console'
+session: 'PromptSession'
+
+
+def load_interface_modules():
+    """Импортирует (и при необходимости устанавливает) модули, нужные только для интерфейса программы\n
+    Вызывается при запуске интерфейса, чтобы операции `PDFer` можно было импортировать без них"""
+    global ValidationError, PromptSession, WordCompleter, Validator, Console, console, session
+    if 'session' in globals():
+        return
+
+    if PyPDF2 is None:
+        import_or_install_module('PyPDF2')
+    import_or_install_module('inquirer')
+    from inquirer.errors import ValidationError
+
+    import_or_install_module('prompt_toolkit')
+    from prompt_toolkit import PromptSession
+    from prompt_toolkit.completion import WordCompleter
+    from prompt_toolkit.validation import Validator
+
+    import_or_install_module('rich')
+    from rich.console import Console
+
+    console = Console()
+    session = PromptSession()
+
+
+class Phase:
+    """Класс, замеряющий одну фазу операции для `Profiler`\n
+    Внутри блока `with` в возвращаемый словарь можно дописать свои поля, например число страниц или байтов"""
+
+    def __init__(self, operation: str, phase: str, fields: dict):
+        self.event = {'operation': operation, 'phase': phase, **fields}
+
+    def __enter__(self) -> dict:
+        self.started = time.perf_counter()
+        return self.event
+
+    def __exit__(self, exc_type, exc, tb):
+        self.event['seconds'] = round(time.perf_counter() - self.started, 6)
+        if resource is not None:
+            self.event['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if exc_type is not None:
+            self.event['error'] = exc_type.__name__
+        for sink in Profiler.sinks:
+            sink(self.event)
+
+
+class NoPhase:
+    """Класс-заглушка фазы для выключенного `Profiler`: ничего не замеряет и никуда не пишет"""
 
-import_or_install_module('prompt_toolkit')
-from prompt_toolkit import PromptSession  # noqa: E402
-from prompt_toolkit.completion import WordCompleter  # noqa: E402
-from prompt_toolkit.validation import Validator  # noqa: E402
+    def __enter__(self) -> dict:
+        return {}
 
-import_or_install_module('rich')
-from rich.console import Console  # noqa: E402
+    def __exit__(self, exc_type, exc, tb):
+        return None
 
-import_or_install_module('PyPDF2')
 
-console = Console()
-session = PromptSession()
+class Profiler:
+    """Класс, собирающий длительность, число страниц и байтов и пиковую память по фазам операций PDFer
+    (разбор входного файла, копирование страниц, склеивание ресурсов, запись) и передающий их в подключённые
+    обработчики\n
+    Пока ни один обработчик не подключён, `Profiler.phase` возвращает общую заглушку и почти ничего не стоит"""
+
+    sinks: list[Callable[[dict], None]] = []
+    no_phase = NoPhase()
+
+    @staticmethod
+    def phase(operation: str, phase: str, **fields) -> 'Phase | NoPhase':
+        """Возвращает контекстный менеджер, замеряющий фазу `phase` операции `operation`"""
+        if not Profiler.sinks:
+            return Profiler.no_phase
+        return Phase(operation, phase, fields)
+
+    @staticmethod
+    def add_sink(sink: Callable[[dict], None]):
+        """Подключает обработчик `sink`, который получает словарь с замерами каждой фазы"""
+        Profiler.sinks.append(sink)
+
+    @staticmethod
+    def remove_sink(sink: Callable[[dict], None]):
+        """Отключает обработчик `sink`"""
+        Profiler.sinks.remove(sink)
+
+    @staticmethod
+    def log_sink(file=sys.stderr) -> Callable[[dict], None]:
+        """Возвращает обработчик, который пишет замеры в `file` построчно в формате JSON"""
+        return lambda event: print(json.dumps(event, ensure_ascii=False), file=file, flush=True)
+
+
+class AtomicWriter:
+    """Класс, записывающий файл атомарно: во временный файл в той же папке, а затем `os.replace`
+    на место итогового, так что при сбое по итоговому пути не остаётся обрезанного файла"""
+
+    fsync = False
+    counter = itertools.count()
+
+    def __init__(self, path: str, mode: str = 'wb', encoding: str | None = None):
+        self.path = path
+        self.mode = mode
+        self.encoding = encoding
+
+    @staticmethod
+    def temp_path(path: str) -> str:
+        """Возвращает уникальное имя скрытого временного файла рядом с файлом `path`"""
+        directory, name = os.path.split(os.path.abspath(path))
+        return os.path.join(directory, f'.{name}.{os.getpid()}.{next(AtomicWriter.counter)}.tmp')
+
+    @staticmethod
+    def sync_directory(path: str):
+        """Сбрасывает на диск запись о файле `path` в его папке (на Windows не требуется и невозможно)"""
+        if os.name != 'posix':
+            return
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def __enter__(self):
+        self.temp_name = AtomicWriter.temp_path(self.path)
+        fd = os.open(self.temp_name, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+        self.file = os.fdopen(fd, self.mode, encoding=self.encoding)
+        return self.file
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.file.flush()
+                if AtomicWriter.fsync:
+                    os.fsync(self.file.fileno())
+            self.file.close()
+            if exc_type is None:
+                os.replace(self.temp_name, self.path)
+                if AtomicWriter.fsync:
+                    AtomicWriter.sync_directory(self.path)
+        finally:
+            if os.path.exists(self.temp_name):
+                os.remove(self.temp_name)
+
+
+class ReaderCache:
+    """Класс, хранящий уже разобранные PDF-файлы для повторных операций с ними\n
+    Ключ кэша — имя бэкенда и абсолютный путь к файлу, а запись считается устаревшей, если у файла изменились
+    время изменения или размер. Старые записи вытесняются по LRU, как только число записей превышает
+    `max_entries` или суммарный размер файлов превышает `max_bytes`"""
+
+    def __init__(self, max_entries: int = 32, max_bytes: int = 1024 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: collections.OrderedDict = collections.OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, input_pdf: str, backend: 'Backend | None' = None):
+        """Возвращает PDF-файл `input_pdf`, разобранный бэкендом `backend` (по умолчанию `PyPDF2Backend`),
+        при необходимости разбирая его заново"""
+        backend = backend or PyPDF2Backend()
+        key = (backend.name, os.path.abspath(input_pdf))
+        stat = os.stat(key[1])
+        if key in self.entries:
+            mtime, size, document = self.entries[key]
+            if (mtime, size) == (stat.st_mtime_ns, stat.st_size):
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return document
+            self.discard(key)
+
+        self.misses += 1
+        document = backend.parse(input_pdf)
+        self.entries[key] = (stat.st_mtime_ns, stat.st_size, document)
+        self.size += stat.st_size
+        while len(self.entries) > 1 and (len(self.entries) > self.max_entries or self.size > self.max_bytes):
+            self.discard(next(iter(self.entries)))
+        return document
+
+    def discard(self, key: tuple[str, str]):
+        """Удаляет из кэша запись с ключом `key`"""
+        _, size, _ = self.entries.pop(key)
+        self.size -= size
+
+    def stats(self) -> dict:
+        """Возвращает статистику кэша: число попаданий, промахов, записей и их суммарный размер в байтах"""
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries), 'bytes': self.size}
+
+
+class ResultCache:
+    """Класс, хранящий на диске уже созданные PDF-файлы по SHA-256 входных файлов и описания операции
+
+    Старые записи вытесняются по LRU, как только суммарный размер файлов превышает `max_bytes`"""
+
+    version = 1  # меняется, когда меняется содержимое создаваемых файлов, чтобы старые записи не отдавались
+
+    def __init__(self, directory: str = '', max_bytes: int = 1024 * 1024 * 1024):
+        cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        self.directory = directory or os.path.join(cache_home, 'pdfer')
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def load(self, name: str) -> dict:
+        """Возвращает содержимое JSON-файла `name` из каталога кэша или пустой словарь"""
+        try:
+            with open(self.path(name), encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self, name: str, data: dict):
+        """Атомарно записывает `data` в JSON-файл `name` в каталоге кэша"""
+        with AtomicWriter(self.path(name), 'w', 'utf-8') as file:
+            json.dump(data, file, ensure_ascii=False)
+
+    def key(self, operation: str, input_pdfs: list[str], spec: dict) -> str:
+        """Возвращает ключ записи для операции `operation` над файлами `input_pdfs` с параметрами `spec`\n
+        SHA-256 входных файлов запоминается в `fingerprints.json` и не пересчитывается, пока у файла
+        не изменились размер или время изменения"""
+        os.makedirs(self.directory, exist_ok=True)
+        known = self.load('fingerprints.json')
+        hashes = []
+        changed = False
+        for input_pdf in input_pdfs:
+            path = os.path.abspath(input_pdf)
+            entry = PDFer.fingerprint(path, known.get(path))
+            if entry is not known.get(path):
+                known[path] = entry
+                changed = True
+            hashes.append(entry['sha256'])
+        if changed:
+            self.save('fingerprints.json', known)
+        description = {'version': ResultCache.version, 'operation': operation, 'inputs': hashes, **spec}
+        return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key: str, output_pdf: str, stats: dict | None = None) -> bool:
+        """Отдаёт запись `key` в файл `output_pdf`, если она есть в кэше, и возвращает, было ли попадание\n
+        Сохранённая вместе с записью статистика операции дописывается в `stats`, если он передан"""
+        entry = self.path(f'{key}.pdf')
+        meta = self.load(f'{key}.json')
+        try:
+            # отданный жёсткой ссылкой файл могли изменить на месте, и тогда вместе с ним изменилась и запись
+            if os.path.getsize(entry) != meta.get('size') or PDFer.fingerprint(entry)['sha256'] != meta.get('sha256'):
+                os.remove(entry)
+                raise FileNotFoundError(entry)
+        except OSError:
+            self.misses += 1
+            return False
+
+        if not (os.path.exists(output_pdf) and os.path.samefile(entry, output_pdf)):  # иначе файл уже на месте
+            temp_name = AtomicWriter.temp_path(output_pdf)
+            try:
+                try:
+                    os.link(entry, temp_name)
+                except OSError:
+                    shutil.copyfile(entry, temp_name)
+                os.replace(temp_name, output_pdf)
+            finally:
+                if os.path.exists(temp_name):
+                    os.remove(temp_name)
+        os.utime(entry)
+        self.hits += 1
+        if stats is not None:
+            stats.update(meta.get('stats', {}))
+        return True
+
+    def put(self, key: str, output_pdf: str, stats: dict | None = None):
+        """Сохраняет созданный файл `output_pdf` в кэш под ключом `key` вместе со статистикой операции `stats`\n
+        Файл копируется, а не связывается ссылкой, чтобы его дальнейшая перезапись не портила запись кэша"""
+        entry = self.path(f'{key}.pdf')
+        with open(output_pdf, 'rb') as input_file, AtomicWriter(entry) as output_file:
+            shutil.copyfileobj(input_file, output_file)
+        fingerprint = PDFer.fingerprint(entry)
+        self.save(f'{key}.json', {'size': fingerprint['size'], 'sha256': fingerprint['sha256'], 'stats': stats or {}})
+        self.evict()
+
+    def evict(self):
+        """Удаляет самые давно использованные записи, пока их суммарный размер превышает `max_bytes`"""
+        entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.pdf')]
+        entries = sorted((entry.stat().st_mtime_ns, entry.stat().st_size, entry.path) for entry in entries)
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, entry in entries:
+            if size <= self.max_bytes:
+                break
+            for file_name in (entry, entry.removesuffix('.pdf') + '.json'):
+                try:
+                    os.remove(file_name)
+                except FileNotFoundError:
+                    pass
+            size -= entry_size
+
+    def stats(self) -> dict:
+        """Возвращает статистику кэша: число попаданий и промахов"""
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+class DirectoryIndex:
+    """Класс, хранящий сведения о PDF-файлах папки: размер, время изменения, число страниц и заголовок\n
+    Индекс строится в фоновом потоке через `os.scandir`: имена файлов доступны сразу, а число страниц и заголовок
+    дописываются по мере чтения файлов. Индекс сохраняется в файл `.pdfer-index.json` в той же папке,
+    и при обновлении заново читаются только файлы с изменившимися размером или временем изменения"""
+
+    file_name = '.pdfer-index.json'
+
+    def __init__(self, directory: str = '.'):
+        self.directory = directory
+        self.entries: dict[str, dict] = {}
+        self.thread: threading.Thread | None = None
+        try:
+            with open(os.path.join(directory, DirectoryIndex.file_name), encoding='utf-8') as file:
+                self.entries = json.load(file)
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def peek(input_pdf: str) -> dict:
+        """Возвращает число страниц и заголовок PDF-файла `input_pdf`\n
+        PyPDF2 читает таблицу xref целиком, но из объектов разбираются только каталог, корень дерева страниц
+        и сведения о документе, а сами страницы — нет. Для повреждённых файлов число страниц — `None`"""
+        try:
+            with open(input_pdf, 'rb') as file:
+                reader = PyPDF2.PdfReader(file)
+                pages = int(reader.trailer['/Root']['/Pages']['/Count'])
+                title = (reader.metadata or {}).get('/Title') or ''
+            return {'pages': pages, 'title': str(title)}
+        except Exception:
+            return {'pages': None, 'title': ''}
+
+    def refresh(self):
+        """Обновляет индекс по текущему содержимому папки и сохраняет его, если что-то изменилось\n
+        Новые и изменившиеся файлы попадают в индекс сразу после `os.scandir` без числа страниц и заголовка,
+        которые дописываются по мере чтения файлов"""
+        entries = {}
+        pending = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if not entry.name.endswith('.pdf') or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                known = self.entries.get(entry.name)
+                if known and (known['size'], known['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+                    entries[entry.name] = known
+                    continue
+                entries[entry.name] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'pages': None, 'title': ''}
+                pending.append(entry)
+        changed = bool(pending) or len(entries) != len(self.entries)
+        self.entries = entries
+        for entry in pending:  # ключи не добавляются, поэтому читать индекс из другого потока безопасно
+            entries[entry.name] = {**entries[entry.name], **DirectoryIndex.peek(entry.path)}
+        if not changed:
+            return
+        index_file = os.path.join(self.directory, DirectoryIndex.file_name)
+        try:
+            with AtomicWriter(index_file, 'w', 'utf-8') as file:
+                json.dump(entries, file, ensure_ascii=False)
+        except OSError:  # папка только для чтения — индекс живёт только в памяти
+            pass
+
+    def refresh_in_background(self):
+        """Запускает обновление индекса в фоновом потоке, если оно ещё не идёт"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self.refresh, daemon=True)
+        self.thread.start()
+
+    def files(self) -> list[str]:
+        """Возвращает имена PDF-файлов папки"""
+        return sorted(self.entries)
+
+    def meta(self) -> dict[str, str]:
+        """Возвращает подписи к именам файлов для автодополнения: число страниц и заголовок"""
+        return {
+            name: ' · '.join(filter(None, [f'{entry["pages"]} стр.' if entry['pages'] else '', entry['title']]))
+            for name, entry in self.entries.items()
+        }
+
+    def page_count(self, input_pdf: str) -> int | None:
+        """Возвращает число страниц PDF-файла `input_pdf`: из индекса, если файл в нём есть, уже прочитан
+        и не изменился, иначе — через `DirectoryIndex.peek`"""
+        entry = self.entries.get(os.path.relpath(input_pdf, self.directory))
+        try:
+            stat = os.stat(input_pdf)
+        except OSError:
+            return None
+        if entry and entry['pages'] and (entry['size'], entry['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+            return entry['pages']
+        return DirectoryIndex.peek(input_pdf)['pages']
+
+
+class PagePlan:
+    """Класс, описывающий план извлечения страниц, скомпилированный из строки диапазонов вида '1-5, 8, 11-13'\n
+    План проверяется один раз при компиляции, а затем по числу страниц документа превращается в компактный
+    массив `array('I')` индексов страниц — ещё до того, как начнётся копирование страниц"""
+
+    pattern = re.compile(r'^\d+(-\d+)?$')
+
+    def __init__(self, page_ranges: list[list[int]]):
+        self.page_ranges = page_ranges
+
+    @staticmethod
+    def is_valid(page_ranges_str: str) -> bool:
+        """Проверяет, что строка `page_ranges_str` состоит из чисел и диапазонов через дефис, разделённых запятыми"""
+        return all(PagePlan.pattern.match(part) for part in page_ranges_str.replace(' ', '').split(','))
+
+    @staticmethod
+    def compile(page_ranges_str: str) -> 'PagePlan':
+        """Компилирует строку `page_ranges_str` в план извлечения страниц"""
+        if not PagePlan.is_valid(page_ranges_str):
+            raise ValueError(f'Некорректные диапазоны страниц: {page_ranges_str!r}')
+        return PagePlan(PDFer.parse_page_ranges(page_ranges_str))
+
+    @property
+    def label(self) -> str:
+        """Строка диапазонов для имени выходного файла"""
+        return PDFer.format_page_ranges(self.page_ranges)
+
+    def resolve(self, page_count: int, strict: bool = False) -> array.array:
+        """Возвращает массив индексов страниц для документа из `page_count` страниц\n
+        При `strict = True` номера страниц за пределами документа вызывают `ValueError`,
+        иначе диапазоны обрезаются до границ документа"""
+        if strict and (outside := self.outside(page_count)):
+            raise ValueError(f'В документе {page_count} стр., страниц {", ".join(map(str, outside))} в нём нет')
+        pages = array.array('I')
+        for page_range in self.page_ranges:
+            pages.extend(PDFer.resolve_page_range(page_count, *page_range))
+        return pages
+
+    def outside(self, page_count: int) -> list[int]:
+        """Возвращает отсортированные номера страниц плана, которых нет в документе из `page_count` страниц"""
+        numbers = {page for page_range in self.page_ranges for page in page_range}
+        return sorted(page for page in numbers if not 0 < page <= page_count)
 
 
 class PDFer:
     """Класс, формирующий основной функционал программы"""
 
+    use_mmap = True
+    optimizer: 'Optimizer | None' = None  # пересжатие и упаковка объектов при записи, см. `Optimizer`
+    shared_types = ('/Font', '/FontDescriptor', '/Encoding', '/ExtGState')
+
+    @staticmethod
+    def resolve_page_range(page_count: int, start_page: int, end_page: int = -1) -> list[int]:
+        """Переводит диапазон страниц от `start_page` до `end_page` включительно (нумерация с 1)
+        в список индексов страниц документа из `page_count` страниц\n
+        Если `end_page` не указана, то диапазон состоит из одной страницы `start_page`.
+        Если `start_page` больше `end_page`, то страницы идут в обратном порядке.
+        Выходящие за пределы документа номера страниц обрезаются до его границ"""
+        if end_page == -1:
+            end_page = start_page
+        if start_page <= end_page:
+            return list(range(max(0, start_page - 1), min(end_page, page_count)))
+        return list(range(min(start_page, page_count) - 1, max(0, end_page - 1) - 1, -1))
+
+    @staticmethod
+    def open_input(input_pdf: str):
+        """Открывает PDF-файл `input_pdf` как поток для `PyPDF2.PdfReader`\n
+        При `PDFer.use_mmap = True` файл отображается в память: чтение идёт напрямую из страничного кэша ОС
+        без копирования всего файла и без лишних системных вызовов. Иначе, а также если файл нельзя отобразить
+        (например, он пустой), возвращается обычный буферизированный файл"""
+        if PDFer.use_mmap:
+            try:
+                with open(input_pdf, 'rb') as file:
+                    return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                pass
+        return open(input_pdf, 'rb')
+
+    @staticmethod
+    def fingerprint(input_pdf: str, known: dict | None = None) -> dict:
+        """Возвращает описание файла `input_pdf` для манифестов `IncrementalMerger` и `ResultCache`\n
+        Если размер и время изменения совпадают с известным описанием `known`, файл не перехешируется"""
+        path = os.path.abspath(input_pdf)
+        stat = os.stat(path)
+        if known and (known['size'], known['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+            return known
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as file:
+            while chunk := file.read(1024 * 1024):
+                sha256.update(chunk)
+        return {'path': path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha256.hexdigest()}
+
+    @staticmethod
+    def read_pdf(input_pdf: str, readers: 'ReaderCache | None' = None) -> 'PyPDF2.PdfReader':
+        """Открывает PDF-файл `input_pdf` на чтение\n
+        Если передан кэш `readers`, то уже разобранный и не изменившийся с тех пор файл берётся из него.
+        Открытый без кэша файл закрывается через `PyPDF2Backend().close` после записи всех его страниц"""
+        return PyPDF2Backend().open(input_pdf, readers)
+
     @staticmethod
-    def extract_page_range(input_pdf: str, start_page: int, end_page: int = -1, output_pdf: str = '') -> str:
+    def write_pdf(writer: 'PyPDF2.PdfWriter', output_pdf: str, operation: str) -> str:
+        """Записывает `writer` в PDF-файл `output_pdf`, если задан `PDFer.optimizer`, — через него"""
+        optimizer = PDFer.optimizer
+        if optimizer and optimizer.level is not None:
+            with Profiler.phase(operation, 'compress', level=optimizer.level) as event:
+                event.update(optimizer.recompress(writer))
+        with Profiler.phase(operation, 'write', output=output_pdf) as event:
+            with AtomicWriter(output_pdf) as output_file:
+                if optimizer:
+                    optimizer.write(writer, output_file)
+                else:
+                    writer.write(output_file)
+                event['bytes'] = output_file.tell()
+        return output_pdf
+
+    @staticmethod
+    def extract_page_range(
+        input_pdf: str, start_page: int, end_page: int = -1, output_pdf: str = '', readers: 'ReaderCache | None' = None
+    ) -> str:
         """Извлекает страницы из PDF-файла `input_pdf` в диапазоне от `start_page`
         до `end_page` включительно и сохраняет их в новый PDF-файл\n
         Если `end_page` не указана, то извлекается только одна страница `start_page`"""
-        with open(input_pdf, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            writer = PyPDF2.PdfWriter()
-
-            if end_page == -1:
-                end_page = start_page
+        backend = Backend.get(PDFer.optimizer is not None)
+        document = backend.open(input_pdf, readers)
+        try:
+            pages = PDFer.resolve_page_range(backend.page_count(document), start_page, end_page)
+            output_pdf = (output_pdf or input_pdf.removesuffix('.pdf')) + PDFer.page_label(pages) + ' [PDFer].pdf'
+            backend.write([(document, pages)], output_pdf, 'extract_page_range')
+        finally:
+            backend.close(document, readers)
+        return output_pdf
 
-            order, shift = (1, 0) if start_page <= end_page else (-1, -2)
-            start_page = max(0, start_page - 1)
-            end_page = min(end_page, len(reader.pages)) + shift
-            for page_num in range(start_page, end_page, order):
-                writer.add_page(reader.pages[page_num])
+    @staticmethod
+    def copy_pages(reader: 'PyPDF2.PdfReader', writer: 'PyPDF2.PdfWriter', pages) -> 'PyPDF2.PdfWriter':
+        """Копирует страницы с индексами `pages` из `reader` в `writer`\n
+        Каждая страница копируется из входного файла только один раз: её повторы становятся новыми
+        словарями страниц, которые ссылаются на уже скопированные содержимое и ресурсы"""
+        copied: dict[int, 'PyPDF2.PageObject'] = {}
+        for page_num in pages:
+            if page_num not in copied:
+                copied[page_num] = writer.add_page(reader.pages[page_num])
+                continue
+            page = PyPDF2.PageObject(writer)
+            page.update({key: value for key, value in copied[page_num].items() if key != '/Parent'})
+            writer.add_page(page)
+        return writer
 
-        output_pdf = (output_pdf or input_pdf.removesuffix('.pdf')) + (
-            (f'_{start_page + 1}' if start_page == end_page else f'_{start_page + 1}-{end_page}') + ' [PDFer].pdf'
-        )
-        with open(output_pdf, 'wb') as output_file:
-            writer.write(output_file)
+    @staticmethod
+    def extract_pages(
+        input_pdf: str,
+        page_ranges: 'list[list[int]] | PagePlan',
+        output_pdf: str,
+        readers: 'ReaderCache | None' = None,
+        strict: bool = False,
+        dedup: bool = False,
+        stats: dict | None = None,
+        cache: 'ResultCache | None' = None,
+    ) -> str:
+        """Извлекает из PDF-файла `input_pdf` все диапазоны страниц `page_ranges` (план `PagePlan` или список
+        в формате `PDFer.parse_page_ranges`) и сохраняет их в один PDF-файл `output_pdf`\n
+        Входной файл разбирается один раз, промежуточные файлы не создаются.
+        При `strict = True` страницы за пределами документа вызывают `ValueError`.
+        При `dedup = True` одинаковые ресурсы склеиваются через `PDFer.deduplicate`, а статистика
+        сэкономленных байтов записывается в словарь `stats`, если он передан.
+        При переданном `cache` (`ResultCache`) повторное извлечение тех же страниц из того же файла
+        отдаётся из кэша без разбора входного файла"""
+        plan = page_ranges if isinstance(page_ranges, PagePlan) else PagePlan(page_ranges)
+        backend = Backend.get(dedup or PDFer.optimizer is not None)
+        if cache:
+            with Profiler.phase('extract_pages', 'cache') as event:
+                spec = {'pages': plan.page_ranges, 'strict': strict, 'dedup': dedup, 'backend': backend.name}
+                spec['optimizer'] = PDFer.optimizer.spec if PDFer.optimizer else None
+                key = cache.key('extract_pages', [input_pdf], spec)
+                event['hit'] = cache.get(key, output_pdf, stats)
+            if event['hit']:
+                return output_pdf
+
+        document = backend.open(input_pdf, readers)
+        try:
+            pages = plan.resolve(backend.page_count(document), strict)
+            result = backend.write([(document, pages)], output_pdf, 'extract_pages', dedup)
+        finally:
+            backend.close(document, readers)
+        (stats if stats is not None else {}).update(result)
+        if cache:
+            cache.put(key, output_pdf, result)
         return output_pdf
 
+    @staticmethod
+    def replace_references(obj, replacements: dict[int, int], writer: 'PyPDF2.PdfWriter'):
+        """Заменяет в объекте `obj` и вложенных в него прямых объектах ссылки на объекты с номерами
+        из ключей `replacements` ссылками на объекты с соответствующими номерами из значений"""
+        stack = [obj]
+        while stack:
+            obj = stack.pop()
+            if isinstance(obj, PyPDF2.generic.DictionaryObject):
+                items = list(obj.items())
+            elif isinstance(obj, PyPDF2.generic.ArrayObject):
+                items = list(enumerate(obj))
+            else:
+                continue
+            for key, value in items:
+                if isinstance(value, PyPDF2.generic.IndirectObject):
+                    if value.idnum in replacements:
+                        obj[key] = PyPDF2.generic.IndirectObject(replacements[value.idnum], 0, writer)
+                else:
+                    stack.append(value)
+
+    @staticmethod
+    def deduplicate(writer: 'PyPDF2.PdfWriter') -> dict:
+        """Склеивает побайтово одинаковые потоки (картинки, шрифты, ICC-профили, содержимое страниц)
+        и словари шрифтов и графических состояний в `writer` в один общий объект\n
+        Проход повторяется, пока находятся дубликаты: после склеивания вложенных объектов одинаковыми
+        становятся и ссылающиеся на них. Возвращает количество склеенных объектов и сэкономленных байтов"""
+        stats = {'objects': 0, 'bytes_saved': 0}
+        while True:
+            seen: dict[bytes, int] = {}
+            replacements: dict[int, int] = {}
+            for idnum, obj in enumerate(writer._objects, 1):
+                if not isinstance(obj, PyPDF2.generic.StreamObject) and not (
+                    isinstance(obj, PyPDF2.generic.DictionaryObject) and obj.get('/Type') in PDFer.shared_types
+                ):
+                    continue
+                buffer = io.BytesIO()
+                obj.write_to_stream(buffer, None)
+                digest = hashlib.sha256(buffer.getvalue()).digest()
+                if digest in seen:
+                    replacements[idnum] = seen[digest]
+                    stats['objects'] += 1
+                    stats['bytes_saved'] += buffer.tell()
+                else:
+                    seen[digest] = idnum
+            if not replacements:
+                return stats
+
+            for idnum in replacements:  # номера объектов сдвигать нельзя, поэтому дубликаты заменяются на null
+                writer._objects[idnum - 1] = PyPDF2.generic.NullObject()
+            for obj in writer._objects:
+                PDFer.replace_references(obj, replacements, writer)
+
+    @staticmethod
+    def page_label(pages) -> str:
+        """Возвращает суффикс имени файла из первой и последней страницы `pages`, например '_3' или '_1-5'"""
+        if not pages:
+            return ''
+        return f'_{pages[0] + 1}' + (f'-{pages[-1] + 1}' if len(pages) > 1 else '')
+
+    @staticmethod
+    def bookmark_chunks(reader: 'PyPDF2.PdfReader') -> list[range]:
+        """Разбивает страницы документа на части по закладкам верхнего уровня\n
+        Страницы до первой закладки, если они есть, образуют отдельную часть"""
+        starts = {0}
+        for item in reader.outline:
+            if not isinstance(item, list):  # вложенные закладки идут списками
+                page_num = reader.get_destination_page_number(item)
+                if page_num is not None and page_num >= 0:
+                    starts.add(page_num)
+        starts = sorted(starts) + [len(reader.pages)]
+        return [range(start, end) for start, end in zip(starts, starts[1:]) if start < end]
+
+    @staticmethod
+    def split(
+        input_pdf: str,
+        every: int = 1,
+        output_pdf: str = '',
+        readers: 'ReaderCache | None' = None,
+        ranges: PagePlan | None = None,
+        bookmarks: bool = False,
+        workers: int = 4,
+    ) -> list[str]:
+        """Разбивает PDF-файл `input_pdf` на части за один проход по файлу: по `every` страниц (при `every = 1` —
+        по одной странице), по диапазонам из плана `ranges` или по закладкам верхнего уровня при `bookmarks = True`\n
+        Части сохраняются в файлы с суффиксом из диапазона страниц, как у `PDFer.extract_page_range`.
+        Страницы копируются из входного файла последовательно, а готовые части записываются на диск
+        параллельно в пуле из `workers` потоков. С другими бэкендами, кроме PyPDF2, каждый поток пула
+        копирует и записывает части из своей копии документа: их документы нельзя читать из нескольких потоков"""
+        backend = Backend.get(bookmarks or PDFer.optimizer is not None)
+        document = reader = backend.open(input_pdf, readers)
+        try:
+            page_count = backend.page_count(document)
+            if ranges is not None:
+                chunks = [PagePlan([page_range]).resolve(page_count) for page_range in ranges.page_ranges]
+            elif bookmarks:
+                chunks = PDFer.bookmark_chunks(reader)
+            else:
+                chunks = [range(start, min(start + every, page_count)) for start in range(0, page_count, every)]
+
+            output_pdf = output_pdf or input_pdf.removesuffix('.pdf')
+            if backend.name != 'PyPDF2':
+                return PDFer.split_parallel(backend, input_pdf, chunks, output_pdf, workers)
+
+            futures: list[concurrent.futures.Future] = []
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+                for pages in chunks:
+                    if not pages:
+                        continue
+                    with Profiler.phase('split', 'copy', pages=len(pages)):
+                        writer = PDFer.copy_pages(reader, PyPDF2.PdfWriter(), pages)
+                    file_name = output_pdf + PDFer.page_label(pages) + ' [PDFer].pdf'
+                    futures.append(executor.submit(PDFer.write_pdf, writer, file_name, 'split'))
+                    # в памяти держим не больше двух готовых частей на поток
+                    in_flight = [future for future in futures if not future.done()]
+                    if len(in_flight) >= 2 * workers:
+                        concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            return [future.result() for future in futures]
+        finally:
+            backend.close(document, readers)  # части уже записаны: пул дожидается всех записей
+
+    @staticmethod
+    def split_parallel(backend: 'Backend', input_pdf: str, chunks: list, output_pdf: str, workers: int) -> list[str]:
+        """Записывает части `chunks` PDF-файла `input_pdf` через бэкенд `backend` в пуле из `workers` потоков,
+        открывая в каждом потоке свою копию документа"""
+        local = threading.local()
+        documents = []
+
+        def write(pages, file_name: str) -> str:
+            if not hasattr(local, 'document'):
+                local.document = backend.parse(input_pdf)
+                documents.append(local.document)
+            backend.write([(local.document, pages)], file_name, 'split')
+            return file_name
+
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+                futures = [
+                    executor.submit(write, pages, output_pdf + PDFer.page_label(pages) + ' [PDFer].pdf')
+                    for pages in chunks
+                    if pages
+                ]
+            return [future.result() for future in futures]
+        finally:
+            for document in documents:
+                backend.close(document)
+
     @staticmethod
     def parse_page_ranges(page_ranges_str: str):
         """Парсит строку `page_ranges_str` с диапазонами страниц в формате '1-5, 8, 11-13'"""
@@ -94,18 +809,1198 @@ class PDFer:
         return page_ranges
 
     @staticmethod
-    def merge_pdfs(input_pdfs: list[str], output_pdf: str):
-        """Склеивает несколько PDF-файлов `input_pdfs` в один PDF-файл `output_pdf`"""
+    def format_page_ranges(page_ranges: list[list[int]]) -> str:
+        """Собирает диапазоны страниц `page_ranges` обратно в строку для имени файла, например '1-5,8,11-13'"""
+        return ','.join('-'.join(map(str, page_range)) for page_range in page_ranges)
+
+    @staticmethod
+    def merge_pdfs(
+        input_pdfs: list[str],
+        output_pdf: str,
+        readers: 'ReaderCache | None' = None,
+        streaming: bool = False,
+        memory_limit: int = 64 * 1024 * 1024,
+        dedup: bool = False,
+        stats: dict | None = None,
+        append: bool = False,
+        cache: 'ResultCache | None' = None,
+    ):
+        """Склеивает несколько PDF-файлов `input_pdfs` в один PDF-файл `output_pdf`\n
+        При `streaming = True` объекты входных файлов сразу дописываются в выходной файл через
+        `StreamingMerger`, и потребление памяти не растёт с количеством входных файлов.
+        При `append = True` в уже склеенный `output_pdf` добавочным обновлением дописываются только те файлы,
+        которых в нём ещё нет, через `IncrementalMerger`.
+        При `dedup = True` одинаковые шрифты, картинки и другие ресурсы разных файлов склеиваются
+        через `PDFer.deduplicate`, а статистика записывается в словарь `stats`, если он передан.
+        При переданном `cache` (`ResultCache`) повторное склеивание тех же файлов в том же порядке
+        отдаётся из кэша без разбора входных файлов (кроме режима `append`, который дописывает файл на месте)"""
+        if append:
+            return IncrementalMerger(output_pdf, memory_limit).merge(input_pdfs)
+        backend = Backend.get(streaming or dedup or PDFer.optimizer is not None)
+        if cache:
+            with Profiler.phase('merge_pdfs', 'cache') as event:
+                spec = {'streaming': streaming, 'dedup': dedup and not streaming, 'backend': backend.name}
+                spec['optimizer'] = PDFer.optimizer.spec if PDFer.optimizer and not streaming else None
+                key = cache.key('merge_pdfs', input_pdfs, spec)
+                event['hit'] = cache.get(key, output_pdf, stats)
+            if event['hit']:
+                return
+        if streaming:
+            StreamingMerger(output_pdf, memory_limit).merge(input_pdfs)
+            if cache:
+                cache.put(key, output_pdf)
+            return
+
+        documents = []
+        try:
+            for input_pdf in input_pdfs:
+                documents.append(backend.open(input_pdf, readers))
+            parts = [(document, range(backend.page_count(document))) for document in documents]
+            result = backend.write(parts, output_pdf, 'merge_pdfs', dedup)
+        finally:
+            for document in documents:
+                backend.close(document, readers)
+        (stats if stats is not None else {}).update(result)
+        if cache:
+            cache.put(key, output_pdf, result)
+
+
+class Optimizer:
+    """Класс, уменьшающий выходные PDF-файлы при записи\n
+    Несжатые потоки и потоки, сжатые FlateDecode (например, содержимое страниц и картинки отсканированных
+    документов), пересжимаются zlib с уровнем `level` в пуле из `workers` потоков — zlib отпускает GIL,
+    поэтому потоки сжимаются параллельно. Новый вариант сохраняется, только если он меньше старого.
+    При `pack = True` все объекты, кроме потоков, упаковываются в объектные потоки `/ObjStm`,
+    а таблица xref записывается сжатым xref-потоком (PDF 1.5)"""
+
+    objects_per_stream = 200
+
+    def __init__(self, level: int | None = 6, pack: bool = False, workers: int | None = None):
+        self.level = level
+        self.pack = pack
+        self.workers = workers
+
+    @property
+    def spec(self) -> dict:
+        """Параметры, от которых зависит содержимое файла, для ключа `ResultCache`"""
+        return {'level': self.level, 'pack': self.pack}
+
+    @staticmethod
+    def compress(data: bytes, decompress: bool, level: int) -> bytes | None:
+        """Сжимает `data` zlib с уровнем `level`, при `decompress = True` сначала распаковывая их\n
+        Возвращает `None`, если поток повреждён и распаковать его нельзя"""
+        try:
+            return zlib.compress(zlib.decompress(data) if decompress else data, level)
+        except zlib.error:
+            return None
+
+    def recompress(self, writer: 'PyPDF2.PdfWriter') -> dict:
+        """Пересжимает потоки в `writer` и возвращает количество пересжатых потоков и их размер до и после\n
+        Потоки с другими фильтрами (JPEG, JBIG2, CCITT) и метаданные XMP не трогаются"""
+        streams = []
+        for idnum, obj in enumerate(writer._objects, 1):
+            if not isinstance(obj, PyPDF2.generic.StreamObject) or obj.get('/Type') == '/Metadata':
+                continue
+            filters = obj.get('/Filter', [])
+            filters = [filters] if isinstance(filters, str) else list(filters)
+            if filters and (not isinstance(obj, PyPDF2.generic.EncodedStreamObject) or filters[0] != '/FlateDecode'):
+                continue
+            streams.append((idnum, obj, bool(filters)))
+
+        stats = {'streams': 0, 'bytes_before': 0, 'bytes_after': 0}
+        with concurrent.futures.ThreadPoolExecutor(self.workers) as executor:
+            results = executor.map(lambda job: Optimizer.compress(job[1]._data, job[2], self.level), streams)
+            for (idnum, obj, filtered), data in zip(streams, results):
+                stats['bytes_before'] += len(obj._data)
+                if data is None or len(data) >= len(obj._data):
+                    stats['bytes_after'] += len(obj._data)
+                    continue
+                stream = PyPDF2.generic.EncodedStreamObject()
+                stream.update(obj)
+                if not filtered:
+                    stream[PyPDF2.generic.NameObject('/Filter')] = PyPDF2.generic.NameObject('/FlateDecode')
+                stream._data = data
+                writer._objects[idnum - 1] = stream
+                stats['streams'] += 1
+                stats['bytes_after'] += len(data)
+        return stats
+
+    def write(self, writer: 'PyPDF2.PdfWriter', output_file):
+        """Записывает `writer` в открытый на запись в двоичном режиме файл `output_file`,
+        при `pack = True` упаковывая объекты в объектные потоки"""
+        if not self.pack or hasattr(writer, '_encrypt'):
+            return writer.write(output_file)
+
+        from PyPDF2.generic import ArrayObject, EncodedStreamObject, NameObject, NumberObject
+
+        if not writer._root:
+            writer._root = writer._add_object(writer._root_object)
+        writer._sweep_indirect_references(writer._root)  # как в PdfWriter.write: переносит чужие объекты в writer
+
+        output_file.write(max(writer.pdf_header, b'%PDF-1.5') + b'\n%\xe2\xe3\xcf\xd3\n')
+        entries = {0: (0, 0, 65535)}
+
+        def write_object(idnum: int, obj):
+            entries[idnum] = (1, output_file.tell(), 0)
+            output_file.write(f'{idnum} 0 obj\n'.encode())
+            obj.write_to_stream(output_file, None)
+            output_file.write(b'\nendobj\n')
+
+        packed = []
+        for idnum, obj in enumerate(writer._objects, 1):
+            if isinstance(obj, PyPDF2.generic.StreamObject):
+                write_object(idnum, obj)
+            elif obj is not None:
+                packed.append((idnum, obj))
+
+        next_id = len(writer._objects) + 1
+        for start in range(0, len(packed), Optimizer.objects_per_stream):
+            offsets, body = [], io.BytesIO()
+            for index, (idnum, obj) in enumerate(packed[start : start + Optimizer.objects_per_stream]):
+                entries[idnum] = (2, next_id, index)
+                offsets.append(f'{idnum} {body.tell()}')
+                obj.write_to_stream(body, None)
+                body.write(b'\n')
+            header = ' '.join(offsets).encode() + b'\n'
+            object_stream = EncodedStreamObject()
+            object_stream.update(
+                {
+                    NameObject('/Type'): NameObject('/ObjStm'),
+                    NameObject('/N'): NumberObject(len(offsets)),
+                    NameObject('/First'): NumberObject(len(header)),
+                    NameObject('/Filter'): NameObject('/FlateDecode'),
+                }
+            )
+            object_stream._data = zlib.compress(header + body.getvalue(), 6 if self.level is None else self.level)
+            write_object(next_id, object_stream)
+            next_id += 1
+
+        xref_offset = output_file.tell()
+        entries[next_id] = (1, xref_offset, 0)
+        width = max(4, (xref_offset.bit_length() + 7) // 8)
+        rows = b''.join(
+            bytes([kind]) + field.to_bytes(width, 'big') + generation.to_bytes(2, 'big')
+            for kind, field, generation in (entries.get(idnum, (0, 0, 0)) for idnum in range(next_id + 1))
+        )
+        xref_stream = EncodedStreamObject()
+        xref_stream.update(
+            {
+                NameObject('/Type'): NameObject('/XRef'),
+                NameObject('/Size'): NumberObject(next_id + 1),
+                NameObject('/W'): ArrayObject([NumberObject(1), NumberObject(width), NumberObject(2)]),
+                NameObject('/Root'): writer._root,
+                NameObject('/Info'): writer._info,
+                NameObject('/Filter'): NameObject('/FlateDecode'),
+            }
+        )
+        if hasattr(writer, '_ID'):
+            xref_stream[NameObject('/ID')] = writer._ID
+        xref_stream._data = zlib.compress(rows, 6 if self.level is None else self.level)
+        write_object(next_id, xref_stream)
+        output_file.write(f'startxref\n{xref_offset}\n%%EOF\n'.encode())
+
+    @staticmethod
+    def report(input_pdf: str, levels, pack: bool = False, workers: int | None = None) -> list[dict]:
+        """Пересохраняет PDF-файл `input_pdf` в память с каждым уровнем сжатия из `levels` и возвращает
+        для каждого уровня время оптимизации и записи и размер файла — чтобы выбрать уровень под свои файлы\n
+        Первая строка (`level = None`) — запись без оптимизации"""
+        backend = Backend.get(True)
+        results = []
+        for level in [None, *levels]:
+            reader = backend.open(input_pdf)
+            try:
+                writer = PDFer.copy_pages(reader, PyPDF2.PdfWriter(), range(len(reader.pages)))
+                started = time.perf_counter()
+                output_file = io.BytesIO()
+                if level is None:
+                    writer.write(output_file)
+                else:
+                    optimizer = Optimizer(level, pack, workers)
+                    optimizer.recompress(writer)
+                    optimizer.write(writer, output_file)
+            finally:
+                backend.close(reader)
+            size = output_file.tell()
+            results.append(
+                {
+                    'level': level,
+                    'pack': pack and level is not None,
+                    'seconds': round(time.perf_counter() - started, 4),
+                    'bytes': size,
+                    'ratio': round(size / results[0]['bytes'], 4) if results else 1.0,
+                }
+            )
+        return results
+
+
+class Backend(abc.ABC):
+    """Базовый класс бэкенда — библиотеки, через которую PDFer открывает PDF-файлы и записывает их страницы
+
+    Подклассы реализуют `parse` и `write`, а при необходимости — `errors` и `close`"""
+
+    name = ''
+    choice = 'auto'  # 'auto' или имя бэкенда
+    selected: 'Backend | None' = None
+
+    @staticmethod
+    def backends() -> dict[str, type['Backend']]:
+        """Возвращает классы бэкендов в порядке предпочтения"""
+        return {'pikepdf': PikepdfBackend, 'pypdf': PypdfBackend, 'PyPDF2': PyPDF2Backend}
+
+    @staticmethod
+    def available() -> list[str]:
+        """Возвращает имена установленных бэкендов в порядке предпочтения, не импортируя их"""
+        return [name for name in Backend.backends() if importlib.util.find_spec(name) is not None]
+
+    @staticmethod
+    def get(pypdf2_only: bool = False) -> 'Backend':
+        """Возвращает выбранный через `Backend.choice` бэкенд, а при `pypdf2_only = True` — `PyPDF2Backend`"""
+        if pypdf2_only:
+            if PyPDF2 is None:
+                raise ValueError('Для этой операции нужен PyPDF2: pip install PyPDF2')
+            return PyPDF2Backend()
+        if not Backend.available():
+            raise ValueError('Не установлена ни одна библиотека для PDF: pip install PyPDF2')
+        if Backend.selected is None or Backend.choice not in ('auto', Backend.selected.name):
+            if Backend.choice == 'auto':
+                Backend.selected = Backend.backends()[Backend.available()[0]]()
+            elif Backend.choice in Backend.available():
+                Backend.selected = Backend.backends()[Backend.choice]()
+            else:
+                raise ValueError(f'Бэкенд {Backend.choice!r} не установлен, доступны: {", ".join(Backend.available())}')
+        return Backend.selected
+
+    @staticmethod
+    def errors_of(names: list[str]) -> tuple[type[Exception], ...]:
+        """Возвращает исключения для повреждённых PDF-файлов всех бэкендов с именами `names`"""
+        return tuple(error for name in names for error in Backend.backends()[name]().errors)
+
+    @property
+    def module(self):
+        """Модуль библиотеки бэкенда, импортируемый при первом обращении"""
+        return importlib.import_module(self.name)
+
+    @property
+    def errors(self) -> tuple[type[Exception], ...]:
+        """Исключения библиотеки бэкенда для повреждённых PDF-файлов"""
+        return (self.module.errors.PyPdfError,)
+
+    @abc.abstractmethod
+    def parse(self, input_pdf: str):
+        """Разбирает PDF-файл `input_pdf` и возвращает документ бэкенда"""
+
+    def open(self, input_pdf: str, readers: 'ReaderCache | None' = None):
+        """Открывает PDF-файл `input_pdf` и возвращает документ бэкенда\n
+        Если передан кэш `readers`, то уже разобранный этим бэкендом и не изменившийся с тех пор файл
+        берётся из него. Такой документ принадлежит кэшу и не закрывается в `Backend.close`"""
+        with Profiler.phase('read_pdf', 'parse', input=input_pdf, backend=self.name) as event:
+            if readers is None:
+                document = self.parse(input_pdf)
+            else:
+                hits = readers.hits
+                document = readers.get(input_pdf, self)
+                event['cached'] = readers.hits > hits
+            if event:
+                event.update(pages=self.page_count(document), bytes=os.path.getsize(input_pdf))
+        return document
+
+    def page_count(self, document) -> int:
+        """Возвращает число страниц документа `document`"""
+        return len(document.pages)
+
+    @abc.abstractmethod
+    def write(
+        self, parts: list[tuple[object, Sequence[int]]], output_pdf: str, operation: str, dedup: bool = False
+    ) -> dict:
+        """Записывает в PDF-файл `output_pdf` страницы с индексами `pages` документов из пар `(document, pages)`
+        в заданном порядке и возвращает статистику склеивания одинаковых ресурсов (только для `PyPDF2Backend`)"""
+
+    def close(self, document, readers: 'ReaderCache | None' = None):
+        """Закрывает документ `document`, если он открыт не из кэша `readers`: освобождает отображение
+        входного файла в память, не дожидаясь сборщика мусора. Иначе на Windows замена выходного файла,
+        совпадающего с входным, не удастся"""
+        if readers is None:
+            document.stream.close()
+
+
+class PyPDF2Backend(Backend):
+    """Бэкенд на PyPDF2 — чистый Python, без дополнительных зависимостей"""
+
+    name = 'PyPDF2'
+
+    def parse(self, input_pdf: str) -> 'PyPDF2.PdfReader':
+        return PyPDF2.PdfReader(PDFer.open_input(input_pdf))
+
+    def write(self, parts, output_pdf: str, operation: str, dedup: bool = False) -> dict:
         writer = PyPDF2.PdfWriter()
+        for reader, pages in parts:
+            with Profiler.phase(operation, 'copy', pages=len(pages)):
+                PDFer.copy_pages(reader, writer, pages)
+        result = {}
+        if dedup:
+            with Profiler.phase(operation, 'dedup') as event:
+                event.update(result := PDFer.deduplicate(writer))
+        PDFer.write_pdf(writer, output_pdf, operation)
+        return result
+
+
+class PypdfBackend(Backend):
+    """Бэкенд на pypdf — преемнике PyPDF2, который развивается до сих пор"""
+
+    name = 'pypdf'
+
+    def parse(self, input_pdf: str):
+        return self.module.PdfReader(PDFer.open_input(input_pdf))
+
+    def write(self, parts, output_pdf: str, operation: str, dedup: bool = False) -> dict:
+        writer = self.module.PdfWriter()
+        for reader, pages in parts:
+            with Profiler.phase(operation, 'copy', pages=len(pages), backend=self.name):
+                copied = {}
+                for page_num in pages:  # повторы страницы ссылаются на уже скопированные содержимое и ресурсы
+                    if page_num not in copied:
+                        copied[page_num] = writer.add_page(reader.pages[page_num])
+                        continue
+                    page = self.module.PageObject(writer)
+                    page.update({key: value for key, value in copied[page_num].items() if key != '/Parent'})
+                    writer.add_page(page)
+        with Profiler.phase(operation, 'write', output=output_pdf, backend=self.name) as event:
+            with AtomicWriter(output_pdf) as output_file:
+                writer.write(output_file)
+                event['bytes'] = output_file.tell()
+        return {}
+
+
+class PikepdfBackend(Backend):
+    """Бэкенд на pikepdf: разбор и запись выполняет C++-библиотека qpdf, что на больших файлах
+    с длинными таблицами xref во много раз быстрее чистого Python"""
+
+    name = 'pikepdf'
+
+    @property
+    def errors(self) -> tuple[type[Exception], ...]:
+        return (self.module.PdfError,)
+
+    def parse(self, input_pdf: str):
+        access_mode = self.module.AccessMode.mmap if PDFer.use_mmap else self.module.AccessMode.default
+        return self.module.open(input_pdf, access_mode=access_mode)
+
+    def write(self, parts, output_pdf: str, operation: str, dedup: bool = False) -> dict:
+        with self.module.new() as output:
+            for document, pages in parts:
+                with Profiler.phase(operation, 'copy', pages=len(pages), backend=self.name):
+                    copied: dict[int, int] = {}
+                    for page_num in pages:  # повтор страницы qpdf копирует неглубоко, с общими содержимым и ресурсами
+                        if page_num in copied:
+                            output.pages.append(output.pages[copied[page_num]])
+                        else:
+                            output.pages.append(document.pages[page_num])
+                            copied[page_num] = len(output.pages) - 1
+            with Profiler.phase(operation, 'write', output=output_pdf, backend=self.name) as event:
+                with AtomicWriter(output_pdf) as output_file:
+                    output.save(output_file)
+                    event['bytes'] = output_file.tell()
+        return {}
+
+    def close(self, document, readers: 'ReaderCache | None' = None):
+        if readers is None:
+            document.close()
+
+
+class StreamingMerger:
+    """Класс, склеивающий PDF-файлы с ограниченным потреблением памяти\n
+    Объекты страниц каждого входного файла перенумеровываются и сразу дописываются в выходной файл,
+    после чего входной файл закрывается. В памяти остаются только смещения объектов для таблицы xref"""
+
+    def __init__(self, output_pdf: str, memory_limit: int = 64 * 1024 * 1024):
+        self.output_pdf = output_pdf
+        self.memory_limit = memory_limit
+        self.offsets: dict[int, tuple[int, int]] = {}  # номер объекта -> (смещение, поколение)
+        self.next_id = 3  # 1 — дерево страниц, 2 — каталог
+        self.pages_ref = (1, 0)
+        self.kids: list[int] = []
+
+    def allocate(self) -> int:
+        """Выделяет номер для нового объекта выходного файла"""
+        self.next_id += 1
+        return self.next_id - 1
+
+    def write_object(self, output_file, idnum: int, obj, generation: int = 0):
+        """Дописывает объект `obj` под номером `idnum` в выходной файл `output_file`"""
+        self.offsets[idnum] = (output_file.tell(), generation)
+        output_file.write(f'{idnum} {generation} obj\n'.encode())
+        obj.write_to_stream(output_file, None)
+        output_file.write(b'\nendobj\n')
+
+    def write_xref(self, output_file, trailer: 'PyPDF2.generic.DictionaryObject'):
+        """Дописывает таблицу xref для всех записанных объектов и трейлер `trailer`\n
+        Таблица разбивается на подразделы из подряд идущих номеров, поэтому подходит и для добавочного обновления"""
+        xref = output_file.tell()
+        entries = sorted(self.offsets.items())
+        output_file.write(b'xref\n')
+        start = 0
+        while start < len(entries):
+            end = start + 1
+            while end < len(entries) and entries[end][0] == entries[end - 1][0] + 1:
+                end += 1
+            output_file.write(f'{entries[start][0]} {end - start}\n'.encode())
+            for idnum, (offset, generation) in entries[start:end]:
+                free = idnum == 0
+                output_file.write(f'{offset:010d} {generation:05d} {"f" if free else "n"}\r\n'.encode())
+            start = end
+        output_file.write(b'trailer\n')
+        trailer.write_to_stream(output_file, None)
+        output_file.write(f'\nstartxref\n{xref}\n%%EOF\n'.encode())
 
+    @staticmethod
+    def copy(obj, id_map: dict, pending: list, allocate):
+        """Копирует прямой объект `obj`, заменяя ссылки на объекты входного файла ссылками на объекты выходного\n
+        Ещё не записанные объекты получают новый номер в `id_map` и добавляются в очередь `pending`"""
+        if isinstance(obj, PyPDF2.generic.IndirectObject):
+            key = (obj.idnum, obj.generation)
+            if key not in id_map:
+                id_map[key] = allocate()
+                pending.append(obj)
+            return PyPDF2.generic.IndirectObject(id_map[key], 0, None)  # type: ignore
+        if isinstance(obj, PyPDF2.generic.StreamObject):
+            stream = obj.__class__()
+            stream._data = obj._data
+            for key, value in obj.items():
+                if key != '/Length':
+                    stream[key] = StreamingMerger.copy(value, id_map, pending, allocate)
+            return stream
+        if isinstance(obj, PyPDF2.generic.DictionaryObject):
+            return PyPDF2.generic.DictionaryObject(
+                {key: StreamingMerger.copy(value, id_map, pending, allocate) for key, value in obj.items()}
+            )
+        if isinstance(obj, PyPDF2.generic.ArrayObject):
+            return PyPDF2.generic.ArrayObject(StreamingMerger.copy(value, id_map, pending, allocate) for value in obj)
+        return obj
+
+    def append(self, output_file, input_pdf: str):
+        """Дописывает все страницы PDF-файла `input_pdf` в выходной файл `output_file`"""
+        started = output_file.tell()
+        phase = Profiler.phase('merge_pdfs', 'stream', input=input_pdf)
+        with phase as event, PDFer.open_input(input_pdf) as file:
+            reader = PyPDF2.PdfReader(file)
+            if reader.is_encrypted:
+                reader.decrypt('')
+            id_map: dict = {}
+            pending: list = []
+            written = 0
+            page_ids = []
+            for page in reader.pages:  # страницы могут ссылаться друг на друга, поэтому номера выделяются заранее
+                page_ids.append(self.allocate())
+                if page.indirect_reference is not None:
+                    id_map[(page.indirect_reference.idnum, page.indirect_reference.generation)] = page_ids[-1]
+
+            for page, page_id in zip(reader.pages, page_ids):
+                page_copy = StreamingMerger.copy(
+                    PyPDF2.generic.DictionaryObject({k: v for k, v in page.items() if k != '/Parent'}),
+                    id_map,
+                    pending,
+                    self.allocate,
+                )
+                parent = PyPDF2.generic.IndirectObject(*self.pages_ref, None)  # type: ignore
+                page_copy[PyPDF2.generic.NameObject('/Parent')] = parent
+                self.write_object(output_file, page_id, page_copy)
+                self.kids.append(page_id)
+
+                while pending:
+                    ref = pending.pop()
+                    obj = reader.get_object(ref)
+                    if obj is None:
+                        obj = PyPDF2.generic.NullObject()
+                    obj = StreamingMerger.copy(obj, id_map, pending, self.allocate)
+                    self.write_object(output_file, id_map[(ref.idnum, ref.generation)], obj)
+                    written += len(obj._data) if isinstance(obj, PyPDF2.generic.StreamObject) else 0
+                    if written > self.memory_limit:  # разобранные объекты больше не нужны — сбрасываем кэш
+                        reader.resolved_objects.clear()
+                        written = 0
+            event.update(pages=len(page_ids), bytes=output_file.tell() - started)
+
+    def merge(self, input_pdfs: list[str]):
+        """Склеивает PDF-файлы `input_pdfs` в выходной файл"""
+        with AtomicWriter(self.output_pdf) as output_file:
+            output_file.write(b'%PDF-1.7\n%\xe2\xe3\xcf\xd3\n')
+            for input_pdf in input_pdfs:
+                self.append(output_file, input_pdf)
+
+            NameObject, NumberObject = PyPDF2.generic.NameObject, PyPDF2.generic.NumberObject
+            pages = PyPDF2.generic.DictionaryObject(
+                {
+                    NameObject('/Type'): NameObject('/Pages'),
+                    NameObject('/Kids'): PyPDF2.generic.ArrayObject(
+                        PyPDF2.generic.IndirectObject(kid, 0, None) for kid in self.kids  # type: ignore
+                    ),
+                    NameObject('/Count'): NumberObject(len(self.kids)),
+                }
+            )
+            self.write_object(output_file, 1, pages)
+            catalog = PyPDF2.generic.DictionaryObject(
+                {
+                    NameObject('/Type'): NameObject('/Catalog'),
+                    NameObject('/Pages'): PyPDF2.generic.IndirectObject(1, 0, None),  # type: ignore
+                }
+            )
+            self.write_object(output_file, 2, catalog)
+
+            self.offsets[0] = (0, 65535)
+            self.write_xref(
+                output_file,
+                PyPDF2.generic.DictionaryObject(
+                    {
+                        NameObject('/Size'): NumberObject(self.next_id),
+                        NameObject('/Root'): PyPDF2.generic.IndirectObject(2, 0, None),  # type: ignore
+                    }
+                ),
+            )
+
+
+class IncrementalMerger(StreamingMerger):
+    """Класс, дописывающий новые PDF-файлы в конец уже склеенного PDF-файла добавочным обновлением\n
+    Старое содержимое файла не перечитывается и не переписывается: в конец дописываются объекты новых страниц,
+    новая версия дерева страниц и новый раздел xref со ссылкой `/Prev` на предыдущий. Рядом с выходным файлом
+    хранится манифест `<файл>.pdfer.json` с путём, размером, временем изменения и SHA-256 уже склеенных файлов"""
+
+    @property
+    def manifest(self) -> str:
+        return self.output_pdf + '.pdfer.json'
+
+    def merge(self, input_pdfs: list[str]) -> list[str]:
+        """Дописывает в выходной файл те из `input_pdfs`, которых в нём ещё нет, и возвращает их список\n
+        Если выходного файла ещё нет, он создаётся обычным потоковым склеиванием"""
+        entries: list[dict] = []
+        if os.path.exists(self.output_pdf):
+            if not os.path.exists(self.manifest):
+                raise ValueError(f'Для {self.output_pdf} нет манифеста {self.manifest}, дописывать в него нельзя')
+            with open(self.manifest, encoding='utf-8') as file:
+                manifest = json.load(file)
+            entries = manifest['inputs']
+            if 'size' in manifest:
+                self.recover(manifest['size'])
+
+        known: dict[str, list[dict]] = {}  # все склеенные версии каждого файла
+        for entry in entries:
+            known.setdefault(entry['path'], []).append(entry)
+        new_pdfs, new_entries = [], []
         for input_pdf in input_pdfs:
-            with open(input_pdf, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
-                for page_num in range(len(reader.pages)):
-                    writer.add_page(reader.pages[page_num])
+            versions = known.setdefault(os.path.abspath(input_pdf), [])
+            latest = max(versions, key=lambda version: version['mtime_ns'], default=None)
+            entry = PDFer.fingerprint(input_pdf, latest)
+            if same := [version for version in versions if version['sha256'] == entry['sha256']]:
+                # файл только «потрогали» или вернули к уже склеенной версии — запоминаем новое время изменения
+                same[-1].update(entry)
+                continue
+            versions.append(entry)
+            new_pdfs.append(input_pdf)
+            new_entries.append(entry)
+
+        if not entries:
+            super().merge(new_pdfs)
+        elif new_pdfs:
+            self.update(new_pdfs)
+        manifest = {
+            'output': os.path.abspath(self.output_pdf),
+            'size': os.path.getsize(self.output_pdf),
+            'inputs': entries + new_entries,
+        }
+        with AtomicWriter(self.manifest, 'w', 'utf-8') as file:
+            json.dump(manifest, file, indent=2)
+        return new_pdfs
+
+    def recover(self, size: int):
+        """Отрезает от выходного файла добавочное обновление, недописанное из-за сбоя\n
+        В манифесте хранится размер файла `size` после последнего удачного склеивания, а манифест обновляется
+        только после записи файла, поэтому всё, что дописано после `size`, — остатки прерванного обновления"""
+        actual_size = os.path.getsize(self.output_pdf)
+        if actual_size == size:
+            return
+        with open(self.output_pdf, 'rb+') as file:
+            file.seek(max(0, size - 16))
+            if actual_size < size or b'%%EOF' not in file.read(16):
+                raise ValueError(f'{self.output_pdf} изменён после последнего склеивания, дописывать в него нельзя')
+            file.truncate(size)
+
+    def update(self, input_pdfs: list[str]):
+        """Дописывает страницы `input_pdfs` в существующий выходной файл добавочным обновлением"""
+        NameObject, NumberObject = PyPDF2.generic.NameObject, PyPDF2.generic.NumberObject
+        with PDFer.open_input(self.output_pdf) as file:
+            reader = PyPDF2.PdfReader(file)
+            if reader.is_encrypted:
+                raise ValueError(f'{self.output_pdf} зашифрован, дописывать в него нельзя')
+            trailer = reader.trailer
+            root_ref = dict.__getitem__(trailer, '/Root')
+            pages_ref = dict.__getitem__(root_ref.get_object(), '/Pages')
+            pages = PyPDF2.generic.DictionaryObject(pages_ref.get_object().items())
+            kids = list(dict.__getitem__(pages, '/Kids'))
+            new_trailer = PyPDF2.generic.DictionaryObject(
+                {NameObject(key): dict.__getitem__(trailer, key) for key in ('/Root', '/Info', '/ID') if key in trailer}
+            )
+            self.next_id = int(trailer['/Size'])
+            self.pages_ref = (pages_ref.idnum, pages_ref.generation)
 
-        with open(output_pdf, 'wb') as output_file:
-            writer.write(output_file)
+            file.seek(max(0, os.path.getsize(self.output_pdf) - 1024))
+            prev = int(re.findall(rb'startxref\s+(\d+)', file.read())[-1])
+
+        # новый раздел xref — обычная таблица; /Prev может указывать и на таблицу, и на xref-поток.
+        # Переписывать весь файл ради атомарной замены дорого, поэтому при ошибке дописанное отрезается,
+        # а после падения процесса его отрежет `recover` при следующем склеивании
+        size = os.path.getsize(self.output_pdf)
+        with open(self.output_pdf, 'ab') as output_file:
+            try:
+                output_file.write(b'\n')
+                for input_pdf in input_pdfs:
+                    self.append(output_file, input_pdf)
+                kids += [PyPDF2.generic.IndirectObject(kid, 0, None) for kid in self.kids]  # type: ignore
+                pages[NameObject('/Kids')] = PyPDF2.generic.ArrayObject(kids)
+                pages[NameObject('/Count')] = NumberObject(int(pages['/Count']) + len(self.kids))
+                self.write_object(output_file, pages_ref.idnum, pages, pages_ref.generation)
+
+                self.offsets[0] = (0, 65535)  # как и Acrobat, начинаем каждый раздел со свободного объекта 0
+                new_trailer[NameObject('/Size')] = NumberObject(self.next_id)
+                new_trailer[NameObject('/Prev')] = NumberObject(prev)
+                self.write_xref(output_file, new_trailer)
+                output_file.flush()
+                if AtomicWriter.fsync:
+                    os.fsync(output_file.fileno())
+            except BaseException:
+                output_file.truncate(size)
+                raise
+
+
+class Batch:
+    """Класс, выполняющий пакет заданий из манифеста в формате JSON Lines\n
+    Каждая строка манифеста — отдельное задание, например:
+    `{"op": "extract", "input": "a.pdf", "pages": "1-5, 8", "output": "b.pdf"}`,
+    `{"op": "merge", "inputs": ["a.pdf", "b.pdf"], "output": "c.pdf"}`,
+    `{"op": "split", "input": "a.pdf", "every": 10}`"""
+
+    cache: 'ResultCache | None' = None
+
+    def __init__(self):
+        self.readers = ReaderCache()
+
+    @staticmethod
+    def worker_settings() -> tuple:
+        """Возвращает настройки главного процесса для `Batch.init_worker`"""
+        return PDFer.use_mmap, AtomicWriter.fsync, PDFer.optimizer, Batch.cache, Backend.choice
+
+    @staticmethod
+    def init_worker(
+        use_mmap: bool, fsync: bool, optimizer: 'Optimizer | None', cache: 'ResultCache | None', backend: str
+    ):
+        """Переносит настройки главного процесса в процесс пула"""
+        PDFer.use_mmap = use_mmap
+        AtomicWriter.fsync = fsync
+        PDFer.optimizer = optimizer
+        Batch.cache = cache
+        Backend.choice = backend
+
+    def run_job(self, job: dict, stats: dict | None = None) -> list[str]:
+        """Выполняет одно задание `job` и возвращает список созданных файлов\n
+        Статистика склеивания одинаковых ресурсов (для заданий с `"dedup": true`) записывается в `stats`"""
+        if job['op'] == 'extract':
+            plan = PagePlan.compile(str(job['pages']))
+            output_pdf = job.get('output') or f'{job["input"].removesuffix(".pdf")}_{plan.label} [PDFer].pdf'
+            return [
+                PDFer.extract_pages(
+                    job['input'],
+                    plan,
+                    output_pdf,
+                    self.readers,
+                    bool(job.get('strict')),
+                    bool(job.get('dedup')),
+                    stats,
+                    Batch.cache,
+                )
+            ]
+        if job['op'] == 'merge':
+            if job.get('streaming') or job.get('append'):
+                memory_limit = int(job.get('memory_limit_mb', 64)) * 1024 * 1024
+                append = bool(job.get('append'))
+                PDFer.merge_pdfs(
+                    job['inputs'],
+                    job['output'],
+                    streaming=True,
+                    memory_limit=memory_limit,
+                    append=append,
+                    cache=Batch.cache,
+                )
+            else:
+                PDFer.merge_pdfs(
+                    job['inputs'],
+                    job['output'],
+                    self.readers,
+                    dedup=bool(job.get('dedup')),
+                    stats=stats,
+                    cache=Batch.cache,
+                )
+            return [job['output']]
+        if job['op'] == 'split':
+            return PDFer.split(
+                job['input'],
+                int(job.get('every', 1)),
+                job.get('output', ''),
+                self.readers,
+                PagePlan.compile(str(job['ranges'])) if job.get('ranges') else None,
+                bool(job.get('bookmarks')),
+                int(job.get('threads', 4)),
+            )
+        raise ValueError(f'Неизвестная операция {job["op"]!r}')
+
+    def run_line(self, line_num: int, line: str) -> dict:
+        """Выполняет задание из строки манифеста `line` под номером `line_num` и возвращает его статус"""
+        status: dict = {'job': line_num}
+        started = time.perf_counter()
+        try:
+            job = json.loads(line)
+            status['op'] = job.get('op')
+            if 'id' in job:
+                status['id'] = job['id']
+            stats: dict = {}
+            with Profiler.phase('batch', 'job', job=line_num, op=job.get('op')):
+                status.update(status='ok', outputs=self.run_job(job, stats))
+            if stats:
+                status['dedup'] = stats
+        except Exception as e:
+            status.update(status='error', error=f'{type(e).__name__}: {e}')
+        status['seconds'] = round(time.perf_counter() - started, 4)
+        return status
+
+    @staticmethod
+    def run_group(lines: list[tuple[int, str]]) -> list[dict]:
+        """Выполняет в одном процессе группу заданий `lines`, работающих с одним и тем же входным файлом"""
+        batch = Batch()
+        return [batch.run_line(line_num, line) for line_num, line in lines]
+
+    @staticmethod
+    def source_of(line: str) -> str:
+        """Возвращает входной файл задания из строки манифеста `line`, по которому задания
+        закрепляются за одним процессом"""
+        try:
+            job = json.loads(line)
+            return str(job.get('input') or job.get('inputs', [''])[0])
+        except Exception:
+            return ''
+
+    def run(self, manifest: str, out=sys.stdout, workers: int = 1) -> int:
+        """Выполняет все задания из манифеста `manifest` и построчно выводит их статус в формате JSON в `out`\n
+        При `workers > 1` задания распределяются по пулу из `workers` процессов: все задания с одним
+        входным файлом выполняются одним процессом, чтобы файл не разбирался повторно.
+        Статусы выводятся в порядке строк манифеста. Возвращает количество неудавшихся заданий"""
+        with open(manifest, encoding='utf-8') as file:
+            lines = [(line_num, line) for line_num, line in enumerate(file, 1) if line.strip()]
+
+        failed = 0
+
+        def report(status: dict):
+            nonlocal failed
+            failed += status['status'] != 'ok'
+            print(json.dumps(status, ensure_ascii=False), file=out, flush=True)
+
+        if workers <= 1:
+            for line_num, line in lines:
+                report(self.run_line(line_num, line))
+            return failed
+
+        groups: dict[str, list[tuple[int, str]]] = {}
+        for line_num, line in lines:
+            groups.setdefault(Batch.source_of(line), []).append((line_num, line))
+
+        done: dict[int, dict] = {}
+        order = iter(line_num for line_num, _ in lines)
+        next_line = next(order, None)
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=Batch.init_worker, initargs=Batch.worker_settings()
+        ) as executor:
+            futures = [executor.submit(Batch.run_group, group) for group in groups.values()]
+            for future in concurrent.futures.as_completed(futures):
+                for status in future.result():
+                    done[status['job']] = status
+                while next_line in done:
+                    report(done.pop(next_line))
+                    next_line = next(order, None)
+        return failed
+
+
+class Watcher:
+    """Класс, следящий за папками и применяющий правила из файла в формате JSON Lines к новым PDF-файлам
+
+    Результат каждого файла дописывается в журнал, поэтому после перезапуска обработанные файлы пропускаются"""
+
+    journal_name = '.pdfer-journal.jsonl'
+
+    def __init__(
+        self,
+        directories: list[str],
+        rules_file: str,
+        journal: str = '',
+        workers: int = 2,
+        settle: float = 2.0,
+        interval: float = 1.0,
+        poll: bool = False,
+    ):
+        self.directories = [os.path.abspath(directory) for directory in directories]
+        with open(rules_file, encoding='utf-8') as file:
+            self.rules = [json.loads(line) for line in file if line.strip()]
+        self.journal = journal or os.path.join(self.directories[0], Watcher.journal_name)
+        self.workers = workers
+        self.settle = settle
+        self.interval = interval
+        self.poll = poll
+        self.done: set[tuple[str, int, int]] = set()
+        self.seen: dict[str, tuple[int, int, float]] = {}
+        self.running: dict[concurrent.futures.Future, tuple[str, int, int]] = {}
+        self.expected: dict[concurrent.futures.Future, list[tuple[str, str]]] = {}
+        try:
+            with open(self.journal, encoding='utf-8') as file:
+                line = '\n'
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                        self.done.add((entry['path'], entry['size'], entry['mtime_ns']))
+                    except (ValueError, KeyError, TypeError):  # строка, оборванная при сбое
+                        continue
+            if not line.endswith('\n'):  # следующая запись должна начаться с новой строки
+                with open(self.journal, 'a', encoding='utf-8') as file:
+                    file.write('\n')
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def expand(value, fields: dict):
+        """Подставляет поля нового файла `fields` в строки значения правила `value`"""
+        if isinstance(value, str):
+            return value.format_map(fields)
+        if isinstance(value, list):
+            return [Watcher.expand(item, fields) for item in value]
+        return value
+
+    def jobs_for(self, input_pdf: str) -> list[tuple[int, str]]:
+        """Возвращает задания всех правил, под которые подходит файл `input_pdf`, в формате `Batch.run_group`"""
+        name = os.path.basename(input_pdf)
+        fields = {'path': input_pdf, 'name': name, 'stem': name.removesuffix('.pdf'), 'dir': os.path.dirname(input_pdf)}
+        jobs = []
+        for rule_num, rule in enumerate(self.rules, 1):
+            if not fnmatch.fnmatch(name, rule.get('match', '*.pdf')):
+                continue
+            job = {key: Watcher.expand(value, fields) for key, value in rule.items() if key != 'match'}
+            if job.get('op') in ('extract', 'split'):
+                job.setdefault('input', input_pdf)
+            jobs.append((rule_num, json.dumps(job, ensure_ascii=False)))
+        return jobs
+
+    @staticmethod
+    def outputs(jobs: list[tuple[int, str]]) -> list[tuple[str, str]]:
+        """Возвращает файлы, которые создадут задания `jobs`, парами `(префикс, суффикс)` абсолютных путей:
+        у точного пути суффикс пустой, а части `split` и извлечение без `output` — это все файлы
+        с префиксом выходного пути и суффиксом ` [PDFer].pdf`"""
+        outputs = []
+        for _, line in jobs:
+            job = json.loads(line)
+            if job.get('op') == 'split':
+                prefix = job.get('output') or job.get('input', '').removesuffix('.pdf')
+                outputs.append((os.path.abspath(prefix), ' [PDFer].pdf'))
+            elif job.get('op') == 'extract' and not job.get('output'):
+                outputs.append((os.path.abspath(job.get('input', '').removesuffix('.pdf')) + '_', ' [PDFer].pdf'))
+            elif job.get('output'):
+                outputs.append((os.path.abspath(job['output']), ''))
+        return outputs
+
+    def produced(self, input_pdf: str) -> bool:
+        """Проверяет, создаёт ли файл `input_pdf` одно из выполняющихся заданий"""
+        return any(
+            input_pdf == prefix + suffix or suffix and input_pdf.startswith(prefix) and input_pdf.endswith(suffix)
+            for outputs in self.expected.values()
+            for prefix, suffix in outputs
+        )
+
+    def scan(self) -> set[str]:
+        """Возвращает все PDF-файлы отслеживаемых папок"""
+        files = set()
+        for directory in self.directories:
+            with os.scandir(directory) as scan:
+                files.update(entry.path for entry in scan if entry.name.endswith('.pdf') and entry.is_file())
+        return files
+
+    def ready(self, input_pdf: str, now: float) -> tuple[str, int, int] | None:
+        """Возвращает путь, размер и время изменения файла `input_pdf`, если его пора обрабатывать"""
+        try:
+            stat = os.stat(input_pdf)
+        except OSError:
+            self.seen.pop(input_pdf, None)
+            return None
+        key = (input_pdf, stat.st_size, stat.st_mtime_ns)
+        if key in self.done or key in self.running.values():
+            self.seen.pop(input_pdf, None)
+            return None
+        if self.produced(input_pdf):  # проверим снова, когда задание закончится и запишет его в журнал
+            self.seen[input_pdf] = (-1, -1, now)
+            return None
+        size, mtime_ns, since = self.seen.get(input_pdf, (-1, -1, now))
+        if (size, mtime_ns) != key[1:]:
+            self.seen[input_pdf] = (stat.st_size, stat.st_mtime_ns, now)
+            return None
+        if now - since < self.settle:
+            return None
+        del self.seen[input_pdf]
+        return key
+
+    def finish(self, key: tuple[str, int, int], statuses: list[dict]):
+        """Записывает в журнал результат обработки файла `key` и созданные из него файлы,
+        чтобы они не обрабатывались повторно"""
+        self.done.add(key)
+        if not statuses:  # файл не подошёл ни под одно правило
+            return
+        path, size, mtime_ns = key
+        entries = [
+            {'path': path, 'size': size, 'mtime_ns': mtime_ns, 'time': datetime.now().isoformat(), 'jobs': statuses}
+        ]
+        for output_pdf in (output for status in statuses for output in status.get('outputs', [])):
+            try:
+                stat = os.stat(output_pdf)
+            except OSError:
+                continue
+            output_key = (os.path.abspath(output_pdf), stat.st_size, stat.st_mtime_ns)
+            self.done.add(output_key)
+            entries.append(dict(zip(('path', 'size', 'mtime_ns'), output_key), source=path))
+        with open(self.journal, 'a', encoding='utf-8') as file:
+            for entry in entries:
+                file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        print(json.dumps(entries[0], ensure_ascii=False), flush=True)
+
+    @staticmethod
+    def open_inotify(directories: list[str]) -> tuple[int, dict[int, str]] | None:
+        """Подписывается через inotify на изменения в папках `directories` и возвращает дескриптор
+        и папки по номерам подписок или `None`, если inotify недоступен"""
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            import ctypes
+
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            return None
+        mask = 0x2 | 0x8 | 0x80 | 0x100  # IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        watches = {}
+        for directory in directories:
+            wd = libc.inotify_add_watch(fd, os.fsencode(directory), mask)
+            if wd < 0:
+                os.close(fd)
+                return None
+            watches[wd] = directory
+        return fd, watches
+
+    def read_inotify(self, fd: int, watches: dict[int, str], timeout: float | None) -> set[str]:
+        """Ждёт событий inotify не дольше `timeout` секунд и возвращает изменившиеся PDF-файлы"""
+        if not select.select([fd], [], [], timeout)[0]:
+            return set()
+        files = set()
+        while True:
+            try:
+                data = os.read(fd, 64 * 1024)
+            except BlockingIOError:
+                return files
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = struct.unpack_from('iIII', data, offset)
+                name = data[offset + 16 : offset + 16 + length].rstrip(b'\0').decode(errors='surrogateescape')
+                offset += 16 + length
+                if mask & 0x4000:  # IN_Q_OVERFLOW: события потеряны, пересматриваем папки целиком
+                    files |= self.scan()
+                elif name.endswith('.pdf') and wd in watches:
+                    files.add(os.path.join(watches[wd], name))
+
+    def run(self):
+        """Следит за папками, пока его не прервут"""
+        inotify = None if self.poll else Watcher.open_inotify(self.directories)
+        candidates = self.scan()
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=Batch.init_worker,
+            initargs=Batch.worker_settings(),
+        ) as executor:
+            while True:
+                # сначала записываем готовые результаты, чтобы созданные файлы не приняли за новые
+                for future in [future for future in self.running if future.done()]:
+                    key = self.running.pop(future)
+                    del self.expected[future]
+                    try:
+                        statuses = future.result()
+                    except Exception as e:
+                        statuses = [{'status': 'error', 'error': f'{type(e).__name__}: {e}'}]
+                    self.finish(key, statuses)
+
+                now = time.monotonic()
+                for input_pdf in sorted(candidates | set(self.seen)):
+                    if len(self.running) >= 2 * self.workers:  # остальные файлы подождут в `seen`
+                        self.seen.setdefault(input_pdf, (-1, -1, now))
+                        continue
+                    if key := self.ready(input_pdf, now):
+                        if jobs := self.jobs_for(input_pdf):
+                            future = executor.submit(Batch.run_group, jobs)
+                            self.running[future] = key
+                            self.expected[future] = Watcher.outputs(jobs)
+                        else:
+                            self.finish(key, [])
+
+                timeout = self.interval if self.seen or self.running else None
+                if inotify is None:
+                    time.sleep(self.interval)
+                    candidates = self.scan()
+                else:
+                    candidates = self.read_inotify(*inotify, timeout)
+
+
+class Server:
+    """Класс, принимающий задания по HTTP на localhost или через Unix-сокет\n
+    Задание — тот же JSON-объект, что и строка манифеста `Batch`, в теле запроса `POST /jobs`. Ответ — статус
+    задания в формате JSON, а при `"download": true` — сам созданный PDF-файл. `GET /stats` возвращает глубину
+    очереди и задержки. Задания выполняются в пуле процессов, а если очередь заполнена, сервер сразу отвечает
+    503, чтобы клиенты повторили запрос позже"""
+
+    batch: 'Batch | None' = None  # свой экземпляр в каждом процессе пула, чтобы кэш файлов жил между заданиями
+    chunk_size = 1024 * 1024
+
+    def __init__(self, workers: int = 1, queue_size: int = 100):
+        import asyncio  # asyncio тянет за собой ssl, поэтому импортируется только для сервера
+
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=Batch.init_worker, initargs=Batch.worker_settings()
+        )
+        self.jobs = 0
+        self.in_progress = 0
+        self.completed = 0
+        self.failed = 0
+        self.latencies: collections.deque = collections.deque(maxlen=1000)
+
+    @staticmethod
+    def run_in_worker(job_num: int, line: str) -> dict:
+        """Выполняет задание в процессе пула"""
+        if Server.batch is None:
+            Server.batch = Batch()
+        return Server.batch.run_line(job_num, line)
+
+    async def worker(self):
+        """Забирает задания из очереди и выполняет их в пуле процессов"""
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        while True:
+            job_num, line, future, enqueued = await self.queue.get()
+            self.in_progress += 1
+            try:
+                status = await loop.run_in_executor(self.executor, Server.run_in_worker, job_num, line)
+            except Exception as e:
+                status = {'job': job_num, 'status': 'error', 'error': f'{type(e).__name__}: {e}'}
+            self.in_progress -= 1
+            if status['status'] == 'ok':
+                self.completed += 1
+            else:
+                self.failed += 1
+            self.latencies.append(time.perf_counter() - enqueued)
+            status['latency'] = round(self.latencies[-1], 4)
+            if not future.cancelled():
+                future.set_result(status)
+            self.queue.task_done()
+
+    def stats(self) -> dict:
+        """Возвращает состояние очереди и задержки последних заданий (от постановки в очередь до результата)"""
+        latencies = sorted(self.latencies)
+        percentile = lambda p: round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 4) if latencies else 0
+        return {
+            'queue_depth': self.queue.qsize(),
+            'queue_size': self.queue.maxsize,
+            'in_progress': self.in_progress,
+            'completed': self.completed,
+            'failed': self.failed,
+            'latency': {'p50': percentile(0.5), 'p95': percentile(0.95), 'max': percentile(1)},
+        }
+
+    @staticmethod
+    async def respond(writer: 'asyncio.StreamWriter', code: int, body: bytes = b'', content_type='application/json'):
+        """Отправляет HTTP-ответ с кодом `code` и телом `body`"""
+        reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 503: 'Service Unavailable'}
+        headers = f'HTTP/1.1 {code} {reasons[code]}\r\nContent-Type: {content_type}\r\n'
+        headers += f'Content-Length: {len(body)}\r\n' + ('Retry-After: 1\r\n' if code == 503 else '')
+        writer.write(f'{headers}Connection: close\r\n\r\n'.encode() + body)
+        await writer.drain()
+
+    @staticmethod
+    async def send_file(writer: 'asyncio.StreamWriter', file_name: str):
+        """Отправляет PDF-файл `file_name` в ответ частями, не читая его в память целиком"""
+        headers = 'HTTP/1.1 200 OK\r\nContent-Type: application/pdf\r\n'
+        headers += f'Content-Length: {os.path.getsize(file_name)}\r\n'
+        headers += f'Content-Disposition: attachment; filename="{os.path.basename(file_name)}"\r\n'
+        writer.write(f'{headers}Connection: close\r\n\r\n'.encode())
+        with open(file_name, 'rb') as file:
+            while chunk := file.read(Server.chunk_size):
+                writer.write(chunk)
+                await writer.drain()
+
+    async def handle(self, reader: 'asyncio.StreamReader', writer: 'asyncio.StreamWriter'):
+        """Обрабатывает одно HTTP-соединение"""
+        import asyncio
+
+        try:
+            method, path, _ = (await reader.readline()).decode('latin-1').split(' ', 2)
+            headers = {}
+            while (line := (await reader.readline()).decode('latin-1').strip()):
+                key, _, value = line.partition(':')
+                headers[key.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+            if (method, path) == ('GET', '/stats'):
+                return await Server.respond(writer, 200, json.dumps(self.stats()).encode())
+            if (method, path) != ('POST', '/jobs'):
+                return await Server.respond(writer, 404, b'{"error": "not found"}')
+            try:
+                job = json.loads(body)
+            except ValueError as e:
+                return await Server.respond(writer, 400, json.dumps({'error': str(e)}).encode())
+            if not isinstance(job, dict):
+                return await Server.respond(writer, 400, b'{"error": "job must be a JSON object"}')
+
+            self.jobs += 1
+            future = asyncio.get_running_loop().create_future()
+            try:
+                self.queue.put_nowait((self.jobs, body.decode(), future, time.perf_counter()))
+            except asyncio.QueueFull:
+                body = json.dumps({'error': 'queue is full', **self.stats()}).encode()
+                return await Server.respond(writer, 503, body)
+            status = await future
+
+            if job.get('download') and status['status'] == 'ok' and len(status['outputs']) == 1:
+                return await Server.send_file(writer, status['outputs'][0])
+            await Server.respond(writer, 200, json.dumps(status, ensure_ascii=False).encode())
+        except (ValueError, ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8765, socket_path: str = ''):
+        """Запускает сервер на `host:port` или, если указан `socket_path`, на Unix-сокете"""
+        import asyncio
+
+        workers = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+        if socket_path:
+            server = await asyncio.start_unix_server(self.handle, socket_path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        print(f'PDFer принимает задания на {socket_path or f"http://{host}:{port}"}', file=sys.stderr, flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in workers:
+                task.cancel()
+            self.executor.shutdown(cancel_futures=True)
 
 
 class Validators:
@@ -115,7 +2010,10 @@ class Validators:
     def is_to_exit(x: str) -> bool:
         return x in COMMANDS['exit']
 
-    int_ = Validator.from_callable(lambda x: is_int(x) or Validators.is_to_exit(x), error_message='Введи только число!')
+    int_ = lambda page_count=None: Validator.from_callable(
+        lambda x: (is_int(x) and (page_count is None or 0 < int(x) <= page_count)) or Validators.is_to_exit(x),
+        error_message='Введи только число!' if page_count is None else f'Введи число от 1 до {page_count}!',
+    )
     pdf = lambda pass_enter: Validator.from_callable(
         lambda x: x.endswith('.pdf')
         or x.endswith('.pdf"')
@@ -123,10 +2021,12 @@ class Validators:
         or (x == '' if pass_enter else False),
         error_message='Файл должен быть PDF-файлом!',
     )
-    range_ = Validator.from_callable(
-        lambda x: all([re.match(r'^\s*\d+(\s*-\s*\d+)?\s*$', i) for i in x.replace(' ', '').split(',')])
+
+    range_ = lambda page_count=None: Validator.from_callable(
+        lambda x: (PagePlan.is_valid(x) and (page_count is None or not PagePlan.compile(x).outside(page_count)))
         or Validators.is_to_exit(x),
-        error_message='Введи через запятую только диапазоны через дефис и числа!',
+        error_message='Введи через запятую только диапазоны через дефис и числа'
+        + ('!' if page_count is None else f' от 1 до {page_count}!'),
     )
 
     @staticmethod
@@ -140,6 +2040,9 @@ class Interface:
     """Класс, формирующий интерфейс программы"""
 
     last_option = None
+    readers = ReaderCache()
+    index: 'DirectoryIndex | None' = None
+    cache: 'ResultCache | None' = None
 
     @staticmethod
     def draw_header(full=False, compact=False):
@@ -177,6 +2080,10 @@ class Interface:
     @staticmethod
     def start():
         """Запускает интерфейс программы"""
+        load_interface_modules()
+        if Interface.index is None:  # индекс строится, пока пользователь выбирает действие
+            Interface.index = DirectoryIndex()
+            Interface.index.refresh_in_background()
         Interface.draw_header(full=True)
         questions = [
             inquirer.List(
@@ -199,15 +2106,16 @@ class Interface:
     def get_pdf_file(pass_enter: bool = False, prompt_text: str = '', completer_list: set = set()) -> str | None:
         """Интерфейс для получения имени PDF-файла\n
         При `pass_enter = True` валидатор пропускает пустую строку (в случае если был нажат Enter)"""
-        files = (
-            list(completer_list)
-            or list(set(file for file in os.listdir() if os.path.isfile(file) and file.endswith('.pdf')))
+        Interface.index.refresh_in_background()
+        completer = WordCompleter(
+            lambda: list(completer_list)
+            or Interface.index.files()
             or [
                 'в запущенной папке нет PDF-файлов',
                 'указывай полный путь',
-            ]
+            ],
+            meta_dict=Interface.index.meta(),
         )
-        completer = WordCompleter(files)
         input_pdf = session.prompt(
             prompt_text or 'Введи имя входного PDF-файла: ',
             completer=completer,
@@ -219,6 +2127,14 @@ class Interface:
             return 'exit' if pass_enter else None
         return input_pdf.removeprefix('"').removesuffix('"')
 
+    @staticmethod
+    def page_count(input_pdf: str) -> int | None:
+        """Выводит и возвращает число страниц PDF-файла `input_pdf` из индекса папки"""
+        page_count = Interface.index.page_count(input_pdf)
+        if page_count:
+            console.print(f'В файле {page_count} стр.')
+        return page_count
+
     @override_keyboard_interrupt
     @staticmethod
     def extract_many():
@@ -227,25 +2143,17 @@ class Interface:
         input_pdf = Interface.get_pdf_file()
         if not input_pdf:
             return Interface.start()
-        pages = session.prompt('Введи страницы: ', completer=WordCompleter([]), validator=Validators.range_)
+        page_count = Interface.page_count(input_pdf)
+        pages = session.prompt(
+            'Введи страницы: ', completer=WordCompleter([]), validator=Validators.range_(page_count)
+        )
         if pages in COMMANDS['exit']:
             return Interface.start()
-        try:
-            os.mkdir('temp')
-        except FileExistsError:
-            shutil.rmtree('temp')
-            os.mkdir('temp')
-
-        files: list[str] = []
-        for page_range in PDFer.parse_page_ranges(pages):
-            files.append(
-                PDFer.extract_page_range(input_pdf, *page_range, output_pdf=f'temp/{os.path.basename(input_pdf)}')
-            )
-        pages = ','.join([file.rsplit('_')[1].split(' ')[0] for file in files])
+        plan = PagePlan.compile(pages)
+        pages = plan.label
 
         file_name = f'{input_pdf.removesuffix(".pdf")}_{pages} [PDFer].pdf'
-        PDFer.merge_pdfs(files, file_name)
-        shutil.rmtree('temp')
+        file_name = PDFer.extract_pages(input_pdf, plan, file_name, Interface.readers, cache=Interface.cache)
         file_name = basename if (basename := os.path.basename(file_name)) in os.listdir() else file_name
         console.print(f'[on dark_green]Диапазоны страниц успешно извлечены в файл {file_name}![/on dark_green]')
         input()
@@ -259,20 +2167,23 @@ class Interface:
         input_pdf = Interface.get_pdf_file()
         if not input_pdf:
             return Interface.start()
+        page_count = Interface.page_count(input_pdf)
         start_page = session.prompt(
-            'Введи начальную страницу: ', completer=WordCompleter([]), validator=Validators.int_
+            'Введи начальную страницу: ', completer=WordCompleter([]), validator=Validators.int_(page_count)
         )
         if start_page in COMMANDS['exit']:
             return Interface.start()
         else:
             start_page = int(start_page)
-        end_page = session.prompt('Введи конечную страницу: ', completer=WordCompleter([]), validator=Validators.int_)
+        end_page = session.prompt(
+            'Введи конечную страницу: ', completer=WordCompleter([]), validator=Validators.int_(page_count)
+        )
         if end_page in COMMANDS['exit']:
             return Interface.start()
         else:
             end_page = int(end_page)
 
-        file_name = PDFer.extract_page_range(input_pdf, start_page, end_page)
+        file_name = PDFer.extract_page_range(input_pdf, start_page, end_page, readers=Interface.readers)
         file_name = basename if (basename := os.path.basename(file_name)) in os.listdir() else file_name
         console.print(f'[on dark_green]Диапазон страниц успешно извлечён в файл {file_name}![/on dark_green]')
         input()
@@ -287,18 +2198,59 @@ class Interface:
         if not input_pdf:
             return Interface.start()
 
-        page_number = session.prompt('Введи страницу: ', completer=WordCompleter([]), validator=Validators.int_)
+        page_count = Interface.page_count(input_pdf)
+        page_number = session.prompt(
+            'Введи страницу: ', completer=WordCompleter([]), validator=Validators.int_(page_count)
+        )
         if page_number in COMMANDS['exit']:
             return Interface.start()
         else:
             page_number = int(page_number)
 
-        file_name = PDFer.extract_page_range(input_pdf, page_number)
+        file_name = PDFer.extract_page_range(input_pdf, page_number, readers=Interface.readers)
         file_name = basename if (basename := os.path.basename(file_name)) in os.listdir() else file_name
         console.print(f'[on dark_green]Страница успешно извлечена в файл {file_name}![/on dark_green]')
         input()
         Interface.start()
 
+    @override_keyboard_interrupt
+    @staticmethod
+    def split():
+        """Интерфейс для разбиения PDF-файла на несколько частей"""
+        Interface.draw_header()
+        input_pdf = Interface.get_pdf_file()
+        if not input_pdf:
+            return Interface.start()
+        page_count = Interface.page_count(input_pdf)
+
+        modes = ['По N страниц', 'По одной странице', 'По диапазонам', 'По закладкам']
+        answers = inquirer.prompt([inquirer.List('mode', message='Как разбить файл?', choices=modes, carousel=True)])
+        if not answers:
+            return Interface.start()
+
+        every, plan = 1, None
+        if answers['mode'] == modes[0]:
+            every = session.prompt(
+                'Введи количество страниц в части: ', completer=WordCompleter([]), validator=Validators.int_()
+            )
+            if every in COMMANDS['exit']:
+                return Interface.start()
+            every = max(1, int(every))
+        elif answers['mode'] == modes[2]:
+            pages = session.prompt(
+                'Введи диапазоны частей: ', completer=WordCompleter([]), validator=Validators.range_(page_count)
+            )
+            if pages in COMMANDS['exit']:
+                return Interface.start()
+            plan = PagePlan.compile(pages)
+
+        files = PDFer.split(
+            input_pdf, every, readers=Interface.readers, ranges=plan, bookmarks=answers['mode'] == modes[3]
+        )
+        console.print(f'[on dark_green]PDF-файл успешно разбит на {len(files)} частей![/on dark_green]')
+        input()
+        Interface.start()
+
     @override_keyboard_interrupt
     @staticmethod
     def merge(not_enough: bool = False):
@@ -333,7 +2285,7 @@ class Interface:
             if all(os.path.dirname(file) == base_path for file in input_pdfs[1:]):
                 file_name = os.path.join(base_path, file_name)
         file_name = file_name.removesuffix('.pdf') + ' [PDFer].pdf'
-        PDFer.merge_pdfs(input_pdfs, file_name)
+        PDFer.merge_pdfs(input_pdfs, file_name, Interface.readers, cache=Interface.cache)
         console.print(f'[on dark_green]PDF-файлы успешно склеены в файл {file_name}![/on dark_green]')
         input()
         Interface.start()
@@ -478,6 +2430,16 @@ ACTIONS_MATRIX = {
             '– Затем введи номер страницы, которую хочешь извлечь.',
         ],
     },
+    ' Разбить PDF-файл на части': {
+        'action': Interface.split,
+        'flags': {'help_about_exit': True},
+        'help': [
+            'Разбивает PDF-файл на несколько новых за один проход: по N страниц, по одной странице, по введённым диапазонам или по закладкам верхнего уровня. Каждая часть сохраняется в отдельный файл с диапазоном страниц в имени.\n',
+            '– Для начала введи название PDF-файла, который хочешь разбить.',
+            '– Затем выбери способ разбиения.',
+            '– Если разбиваешь по N страниц или по диапазонам, введи количество страниц в части или диапазоны через запятую.',
+        ],
+    },
     ' Склеить несколько PDF-файлов в один': {
         'action': Interface.merge,
         'flags': {'help_about_exit': True},
@@ -507,15 +2469,215 @@ MENU = list(ACTIONS_MATRIX.keys())[:-3] + [Separator()] + list(ACTIONS_MATRIX.ke
 def main():
     """Точка входа в программу"""
     if not __loader__:
-        Interface.start()
+        return Interface.start()
     elif __loader__.name != os.path.basename(__file__).removesuffix('.py'):  # не запущен как модуль через флаг -m
         if len(sys.argv) == 1:  # не запущен через python
             return Interface.start()
 
-    # TODO: здесь через argparse опишу логику для запуска с параметрами командной строки
-    # TODO: --extract file.pdf a-b,c,d-f
-    # TODO: --merge file1.pdf file2.pdf file3.pdf new_file.pdf
-    # TODO: --help, --about
+    parser = argparse.ArgumentParser(prog='pdfer', description='PDFer — разделение и склеивание PDF-файлов')
+    parser.add_argument(
+        '--no-mmap', action='store_true', help='читать входные файлы обычным буферизированным чтением, без mmap'
+    )
+    parser.add_argument(
+        '--fsync', action='store_true', help='сбрасывать каждый выходной файл на диск перед заменой (медленнее)'
+    )
+    parser.add_argument(
+        '--trace', default='', help="писать замеры фаз операций построчно в JSON в файл ('-' — в stderr)"
+    )
+    parser.add_argument('--profile', default='', help='сохранить профиль cProfile в файл для pstats')
+    parser.add_argument(
+        '--cache', action='store_true', help='отдавать повторные извлечения и склеивания из кэша на диске'
+    )
+    parser.add_argument('--cache-dir', default='', help='каталог кэша (по умолчанию ~/.cache/pdfer)')
+    parser.add_argument(
+        '--cache-size', type=int, default=1024, help='максимальный размер кэша в МБ (по умолчанию 1024)'
+    )
+    parser.add_argument('--compress', action='store_true', help='пересжать потоки выходных файлов zlib')
+    parser.add_argument(
+        '--level',
+        type=int,
+        default=6,
+        choices=range(10),
+        metavar='0-9',
+        help='уровень сжатия zlib для --compress (по умолчанию 6)',
+    )
+    parser.add_argument(
+        '--pack', action='store_true', help='упаковать объекты выходных файлов в объектные потоки и xref-поток'
+    )
+    parser.add_argument(
+        '--backend',
+        default='auto',
+        choices=['auto', *Backend.backends()],
+        help='библиотека для чтения и записи PDF (по умолчанию самая быстрая из установленных)',
+    )
+    commands = parser.add_subparsers(dest='command')
+
+    extract = commands.add_parser('extract', help='извлечь набор страниц из PDF-файла')
+    extract.add_argument('input', help='входной PDF-файл')
+    extract.add_argument('pages', help="диапазоны страниц, например '1-5, 8, 11-13'")
+    extract.add_argument('-o', '--output', default='', help='выходной PDF-файл')
+    extract.add_argument('--dedup', action='store_true', help='склеить одинаковые ресурсы в один объект')
+    extract.add_argument(
+        '--strict', action='store_true', help='не обрезать диапазоны, а сообщать об ошибке для страниц вне документа'
+    )
+
+    merge = commands.add_parser('merge', help='склеить несколько PDF-файлов в один')
+    merge.add_argument('inputs', nargs='+', help='входные PDF-файлы в порядке склеивания')
+    merge.add_argument('output', help='выходной PDF-файл')
+    merge.add_argument('--dedup', action='store_true', help='склеить одинаковые шрифты, картинки и другие ресурсы')
+    merge.add_argument(
+        '--streaming', action='store_true', help='дописывать страницы в выходной файл сразу, не держа их в памяти'
+    )
+    merge.add_argument(
+        '--append',
+        action='store_true',
+        help='дописать в уже склеенный выходной файл только новые входные файлы добавочным обновлением',
+    )
+    merge.add_argument(
+        '--memory-limit', type=int, default=64, help='объём кэша разобранных объектов в МБ для --streaming'
+    )
+
+    split = commands.add_parser('split', help='разбить PDF-файл на части')
+    split.add_argument('input', help='входной PDF-файл')
+    split_mode = split.add_mutually_exclusive_group()
+    split_mode.add_argument('-n', '--every', type=int, default=1, help='количество страниц в одной части')
+    split_mode.add_argument('-r', '--ranges', default='', help="диапазоны страниц частей, например '1-5, 6-10, 11'")
+    split_mode.add_argument('-b', '--bookmarks', action='store_true', help='разбить по закладкам верхнего уровня')
+    split.add_argument('-t', '--threads', type=int, default=4, help='количество потоков для записи частей')
+    split.add_argument('-o', '--output', default='', help='префикс имён выходных PDF-файлов')
+
+    run = commands.add_parser('run', help='выполнить задания из манифеста в формате JSON Lines')
+    run.add_argument('manifest', help='файл манифеста, по одному заданию в строке')
+    run.add_argument(
+        '-j', '--workers', type=int, default=1, help='количество процессов, 0 — по числу ядер (по умолчанию 1)'
+    )
+
+    levels = commands.add_parser('levels', help='сравнить время и размер файла при разных уровнях сжатия')
+    levels.add_argument('input', help='входной PDF-файл')
+    levels.add_argument('-l', '--levels', default='1, 6, 9', help="уровни сжатия zlib (по умолчанию '1, 6, 9')")
+    levels.add_argument('--pack', action='store_true', help='дополнительно упаковать объекты в объектные потоки')
+    levels.add_argument('-t', '--threads', type=int, default=0, help='количество потоков сжатия, 0 — автоматически')
+
+    watch = commands.add_parser('watch', help='следить за папками и обрабатывать новые PDF-файлы по правилам')
+    watch.add_argument('directories', nargs='+', help='отслеживаемые папки')
+    watch.add_argument('-r', '--rules', required=True, help='файл правил, по одному заданию-шаблону в строке')
+    watch.add_argument('-j', '--workers', type=int, default=2, help='количество процессов (по умолчанию 2)')
+    watch.add_argument(
+        '--journal', default='', help=f'журнал обработанных файлов (по умолчанию {Watcher.journal_name} в первой папке)'
+    )
+    watch.add_argument(
+        '--settle', type=float, default=2.0, help='сколько секунд файл не должен меняться перед обработкой'
+    )
+    watch.add_argument('--interval', type=float, default=1.0, help='период опроса папок в секундах')
+    watch.add_argument('--poll', action='store_true', help='опрашивать папки, даже если доступен inotify')
+
+    serve = commands.add_parser('serve', help='принимать задания по HTTP на localhost или через Unix-сокет')
+    serve.add_argument('--host', default='127.0.0.1', help='адрес (по умолчанию 127.0.0.1)')
+    serve.add_argument('--port', type=int, default=8765, help='порт (по умолчанию 8765)')
+    serve.add_argument('--socket', default='', help='путь к Unix-сокету вместо TCP-порта')
+    serve.add_argument('-j', '--workers', type=int, default=0, help='количество процессов, 0 — по числу ядер')
+    serve.add_argument('--queue', type=int, default=100, help='максимальная длина очереди заданий')
+
+    args = parser.parse_args()
+    PDFer.use_mmap = not args.no_mmap
+    AtomicWriter.fsync = args.fsync
+    if args.backend != 'auto' and args.backend not in Backend.available():
+        parser.error(f'бэкенд {args.backend} не установлен, доступны: {", ".join(Backend.available())}')
+    Backend.choice = args.backend
+    if args.trace:
+        Profiler.add_sink(Profiler.log_sink(sys.stderr if args.trace == '-' else open(args.trace, 'a', encoding='utf-8')))
+    if args.profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        atexit.register(lambda: (profiler.disable(), profiler.dump_stats(args.profile)))
+    if args.compress or args.pack:
+        PDFer.optimizer = Optimizer(args.level if args.compress else None, args.pack)
+    if args.cache:
+        Batch.cache = Interface.cache = ResultCache(args.cache_dir, args.cache_size * 1024 * 1024)
+    if args.command is None:
+        return Interface.start()
+    if args.command == 'run':
+        sys.exit(1 if Batch().run(args.manifest, workers=args.workers or os.cpu_count() or 1) else 0)
+    if args.command == 'levels':
+        try:
+            levels = [int(level) for level in args.levels.replace(' ', '').split(',')]
+        except ValueError:
+            parser.error('уровни сжатия указываются числами от 0 до 9 через запятую')
+        if not all(0 <= level <= 9 for level in levels):
+            parser.error('уровни сжатия указываются числами от 0 до 9 через запятую')
+        try:
+            for result in Optimizer.report(args.input, levels, args.pack, args.threads or None):
+                print(json.dumps(result))
+        except (OSError, ValueError, *Backend.errors_of(Backend.available())) as e:
+            parser.exit(1, f'{parser.prog}: {e}\n')
+        return
+    if args.command == 'watch':
+        try:
+            watcher = Watcher(
+                args.directories, args.rules, args.journal, args.workers, args.settle, args.interval, args.poll
+            )
+        except (OSError, ValueError) as e:
+            parser.exit(1, f'{parser.prog}: {e}\n')
+        try:
+            return watcher.run()
+        except KeyboardInterrupt:
+            return
+    if args.command == 'serve':
+        import asyncio
+
+        server = Server(args.workers or os.cpu_count() or 1, args.queue)
+        try:
+            return asyncio.run(server.serve(args.host, args.port, args.socket))
+        except KeyboardInterrupt:
+            return
+
+    if args.command == 'extract':
+        if not PagePlan.is_valid(args.pages):
+            parser.error('диапазоны страниц указываются через запятую числами и диапазонами через дефис')
+        job = {
+            'op': 'extract',
+            'input': args.input,
+            'pages': args.pages,
+            'output': args.output,
+            'strict': args.strict,
+            'dedup': args.dedup,
+        }
+    elif args.command == 'merge':
+        job = {
+            'op': 'merge',
+            'inputs': args.inputs,
+            'output': args.output,
+            'streaming': args.streaming,
+            'memory_limit_mb': args.memory_limit,
+            'dedup': args.dedup,
+            'append': args.append,
+        }
+    else:
+        if args.every < 1:
+            parser.error('количество страниц в одной части должно быть положительным')
+        if args.ranges and not PagePlan.is_valid(args.ranges):
+            parser.error('диапазоны страниц указываются через запятую числами и диапазонами через дефис')
+        job = {
+            'op': 'split',
+            'input': args.input,
+            'every': args.every,
+            'ranges': args.ranges,
+            'bookmarks': args.bookmarks,
+            'output': args.output,
+            'threads': args.threads,
+        }
+    stats: dict = {}
+    try:
+        files = Batch().run_job(job, stats)
+    except (ValueError, OSError, *Backend.errors_of(Backend.available())) as e:
+        parser.exit(1, f'{parser.prog}: {e}\n')
+    for file_name in files:
+        print(file_name)
+    if stats:
+        saved = f'Склеено одинаковых объектов: {stats["objects"]}, сэкономлено {stats["bytes_saved"]} байт'
+        print(saved, file=sys.stderr)
 
 
 if __name__ == '__main__':